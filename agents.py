@@ -1,5 +1,7 @@
 from enum import Enum
-from typing import Any
+import asyncio
+import threading
+from typing import Any, Callable
 
 from abc import ABC, abstractmethod
 
@@ -38,8 +40,20 @@ class AIAgentMessage():
     def is_answer(self, value: bool):
         self._is_answer = value
 
+# Любой обратный адрес в маршруте агента
+ANY_REPLY_TO = None
+
+# Ключ маршрутизации сообщения: (тип функции, это ответ, обратный адрес)
+def route_key(message: AIAgentMessage) -> tuple:
+    return (message.function, message.is_answer, message.reply_to)
+
 # Базовый абстрактный AI-агент
 class BaseAIAgent(ABC):
+    # Маршруты - ключи (тип функции, это ответ, обратный адрес или ANY_REPLY_TO) сообщений, которые обрабатывает агент
+    # Сообщения без маршрута распределяются по уровню уверенности can_handle
+    def routes(self) -> list[tuple]:
+        return []
+
     # Возможность дать ответ
     @abstractmethod
     def can_handle(self, question: AIAgentMessage) -> float:
@@ -50,30 +64,69 @@ class BaseAIAgent(ABC):
     def answer(self, question: AIAgentMessage) -> AIAgentMessage:
         pass
 
+    # Асинхронный ответ на вопрос
+    # По умолчанию синхронный ответ выполняется в пуле потоков, не блокируя цикл событий:
+    # запросы к GigaChat и вычисление эмбеддингов разных запросов идут параллельно
+    async def answer_async(self, question: AIAgentMessage) -> AIAgentMessage:
+        return await asyncio.to_thread(self.answer, question)
+
     # Очистка контекста
     @abstractmethod
     def clear_context(self):
         pass
 
 # Базовый менеджер AI-агентов
+# Исполнитель ищется по таблице маршрутов агентов, ключ с единственным агентом маршрута кэшируется
+# Ключи без маршрута или с несколькими агентами каждый раз опрашиваются (can_handle зависит от содержимого)
 class BaseAIAgentManager():
     def __init__(self, agents: list):
         self._agents: list = agents
+        self._routes: dict[tuple, list[BaseAIAgent]] = {} # Ключ маршрута -> агенты
+        self._route_cache: dict[tuple, BaseAIAgent] = {} # Ключ сообщения -> единственный агент маршрута
+        self._rebuild_routes()
+
+    # Построение таблицы маршрутов
+    def _rebuild_routes(self):
+        self._routes = {}
+        for agent in self._agents:
+            for key in agent.routes():
+                self._routes.setdefault(key, []).append(agent)
+        self._route_cache.clear()
 
     # Добавление агента
     def _add_agent(self, agent: BaseAIAgent):
         self._agents.append(agent)
+        self._rebuild_routes()
 
     # Удаление агента
     def _del_agent(self, agent: BaseAIAgent):
         self._agents.remove(agent)
+        self._rebuild_routes()
 
     # Поиск исполнителя
     def _find_contractor(self, message: AIAgentMessage) -> BaseAIAgent:
+        key = route_key(message)
+        if key in self._route_cache:
+            return self._route_cache[key]
+
+        # Маршрут с точным обратным адресом, затем с любым
+        function, is_answer, _ = key
+        candidates = self._routes.get(key) or self._routes.get((function, is_answer, ANY_REPLY_TO))
+
+        # Единственный агент маршрута - без опроса, с кэшированием
+        if candidates and len(candidates) == 1:
+            self._route_cache[key] = candidates[0]
+            return candidates[0]
+
+        # Несколько агентов или нет маршрута - по уровню уверенности для этого сообщения
+        return self._most_confident(candidates or self._agents, message)
+
+    # Агент с максимальным уровнем уверенности
+    def _most_confident(self, agents: list[BaseAIAgent], message: AIAgentMessage) -> BaseAIAgent:
         # Исполнителем будет агент с максимальным уровнем уверенности
         best_agent = None
         best_confidence = -1.0 # стандартный диапазон: 0.0 - 1.0
-        for agent in self._agents:
+        for agent in agents:
             # Получаем и проверем уровень уверенности AI-агента
             confidence = agent.can_handle(message)
             if confidence > best_confidence:
@@ -84,14 +137,46 @@ class BaseAIAgentManager():
             return None
         return best_agent
 
-    # Ответ на вопрос
-    def answer(self, message: AIAgentMessage) -> AIAgentMessage:
+    # Исполнитель очередного шага ответа (None - ответ завершен, ошибка записана в сообщение)
+    # cancel_event - событие отмены, проверяется перед каждым обращением к агенту
+    # progress - функция progress(agent, message), вызывается перед каждым обращением к агенту
+    def _next_contractor(self, message: AIAgentMessage, cancel_event: threading.Event | None,
+            progress: Callable[[BaseAIAgent, AIAgentMessage], None] | None) -> BaseAIAgent | None:
+        # Проверка отмены запроса
+        if cancel_event is not None and cancel_event.is_set():
+            message.error = InterruptedError("Запрос отменен.")
+            return None
+        # Поиск исполнителя функции
+        agent = self._find_contractor(message)
+        if agent is None:
+            message.error = ValueError("Не удалось найти исполнителя.")
+            return None
+        # Информирование о ходе работы
+        if progress is not None:
+            progress(agent, message)
+        return agent
+
+    # Асинхронный ответ на вопрос
+    # Агенты хранят контекст диалога, поэтому параллельные запросы выполняются разными экземплярами менеджера
+    async def answer_async(self, message: AIAgentMessage, cancel_event: threading.Event | None = None,
+            progress: Callable[[BaseAIAgent, AIAgentMessage], None] | None = None) -> AIAgentMessage:
+        # Цикл поиска ответа
+        while not message.done:
+            agent = self._next_contractor(message, cancel_event, progress)
+            if agent is None:
+                return message
+            # Получение ответа
+            message = await agent.answer_async(message)
+        return message
+
+    # Ответ на вопрос - синхронно, в вызывающем потоке
+    # Без цикла событий: агенты работают в том же потоке, и его ресурсы (соединения с базой данных) переиспользуются
+    def answer(self, message: AIAgentMessage, cancel_event: threading.Event | None = None,
+            progress: Callable[[BaseAIAgent, AIAgentMessage], None] | None = None) -> AIAgentMessage:
         # Цикл поиска ответа
         while not message.done:
-            # Поиск исполнителя функции
-            agent = self._find_contractor(message)
+            agent = self._next_contractor(message, cancel_event, progress)
             if agent is None:
-                message.error = ValueError("Не удалось найти исполнителя.")
                 return message
             # Получение ответа
             message = agent.answer(message)
@@ -0,0 +1,157 @@
+import os
+
+import numpy as np
+import time
+
+from utilities import main_logger
+
+# Приближенный поиск ближайших соседей IVF-flat (инвертированные списки) на NumPy
+# Векторы делятся на кластеры k-means по косинусу, при поиске просматриваются только n_probe ближайших кластеров
+# Центроиды сохраняются в файл, распределение строк по кластерам пересчитывается при загрузке
+class IVFFlatIndex:
+    def __init__(self, centroids: np.ndarray, matrix: np.ndarray, n_probe: int = 16, chunk_size: int = 8192):
+        self.centroids = np.ascontiguousarray(centroids, dtype=np.float32)
+        self.n_probe = n_probe # Просматриваемых кластеров по умолчанию
+
+        # Ближайший центроид каждой строки (частями, чтобы не создавать матрицу N x n_lists целиком)
+        assignments = np.empty(matrix.shape[0], dtype=np.int64)
+        for start in range(0, matrix.shape[0], chunk_size):
+            assignments[start:start + chunk_size] = np.argmax(matrix[start:start + chunk_size] @ self.centroids.T, axis=1)
+
+        # Строки, упорядоченные по кластерам, и границы кластеров
+        self._rows = np.argsort(assignments, kind='stable')
+        self._offsets = np.searchsorted(assignments[self._rows], np.arange(self.centroids.shape[0] + 1))
+
+    # Количество кластеров
+    @property
+    def n_lists(self) -> int:
+        return self.centroids.shape[0]
+
+    # Обучение центроидов сферическим k-means на выборке строк
+    @staticmethod
+    def train(matrix: np.ndarray, n_lists: int, iterations: int = 10, sample_size: int = 256,
+            seed: int = 0) -> np.ndarray:
+        rng = np.random.default_rng(seed)
+        n_lists = max(1, min(n_lists, matrix.shape[0]))
+
+        # Выборка для обучения: не больше sample_size строк на кластер
+        sample_count = min(matrix.shape[0], n_lists * sample_size)
+        sample = matrix[rng.choice(matrix.shape[0], sample_count, replace=False)]
+
+        centroids = sample[rng.choice(sample_count, n_lists, replace=False)].copy()
+        for _ in range(iterations):
+            assignments = np.argmax(sample @ centroids.T, axis=1)
+
+            # Новый центроид - нормализованная сумма векторов кластера
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignments, sample)
+            norms = np.linalg.norm(sums, axis=1)
+
+            # Пустой кластер получает случайный вектор выборки
+            empty = norms == 0.0
+            sums[empty] = sample[rng.choice(sample_count, int(empty.sum()))]
+            norms[empty] = 1.0
+            centroids = sums / norms[:, None]
+
+        return centroids.astype(np.float32)
+
+    # Строки-кандидаты для запроса: содержимое n_probe ближайших кластеров, по возрастанию номера строки
+    def candidates(self, query: np.ndarray, n_probe: int = None) -> np.ndarray:
+        n_probe = max(1, min(n_probe or self.n_probe, self.n_lists))
+        centroid_scores = self.centroids @ query
+
+        if n_probe < self.n_lists:
+            probe = np.argpartition(-centroid_scores, n_probe - 1)[:n_probe]
+        else:
+            probe = np.arange(self.n_lists)
+
+        rows = np.concatenate([self._rows[self._offsets[i]:self._offsets[i + 1]] for i in probe])
+        rows.sort()
+        return rows
+
+    # Тот же индекс для измененной матрицы (центроиды прежние)
+    def reassigned(self, matrix: np.ndarray) -> 'IVFFlatIndex':
+        return IVFFlatIndex(self.centroids, matrix, self.n_probe)
+
+    # Сохранение центроидов (через временный файл)
+    def save(self, file_path: str):
+        temp_path = f'{file_path}.tmp.npz'
+        np.savez(temp_path, centroids=self.centroids)
+        os.replace(temp_path, file_path)
+
+# Рекомендуемое число кластеров для количества строк
+def ivf_list_count(row_count: int) -> int:
+    return max(1, int(np.sqrt(row_count)))
+
+# Индекс IVF-flat: центроиды из файла, если подходят по размерности и числу кластеров, иначе обучение заново
+def load_or_build_ivf_index(matrix: np.ndarray, file_path: str, n_probe: int = 16) -> IVFFlatIndex:
+    logger = main_logger()
+    n_lists = ivf_list_count(matrix.shape[0])
+
+    try:
+        if os.path.exists(file_path):
+            with np.load(file_path, allow_pickle=False) as data:
+                centroids = data['centroids']
+
+            # Центроиды пригодны, пока размерность прежняя, а число строк изменилось не более чем вчетверо
+            if centroids.shape[1] == matrix.shape[1] and n_lists / 2 <= centroids.shape[0] <= n_lists * 2:
+                return IVFFlatIndex(centroids, matrix, n_probe)
+
+    except Exception as e:
+        logger.warning(f'Ошибка загрузки ANN-индекса: {e}')
+
+    start_time = time.perf_counter()
+    index = IVFFlatIndex(IVFFlatIndex.train(matrix, n_lists), matrix, n_probe)
+    logger.info(f'ANN-индекс построен: строк {matrix.shape[0]}, кластеров {index.n_lists}, {time.perf_counter() - start_time:.1f} с')
+
+    try:
+        index.save(file_path)
+
+    except Exception as e:
+        logger.warning(f'Ошибка сохранения ANN-индекса: {e}')
+
+    return index
+
+# Сравнение с точным поиском: [(n_probe, recall@k, мс на запрос приближенного поиска, мс точного), ...]
+def benchmark_ivf_index(matrix: np.ndarray, queries: np.ndarray, k: int = 10,
+                        n_probes: tuple[int, ...] = (1, 2, 4, 8, 16, 32)) -> list[tuple[int, float, float, float]]:
+    index = IVFFlatIndex(IVFFlatIndex.train(matrix, ivf_list_count(matrix.shape[0])), matrix)
+
+    # Точный поиск - эталон
+    start_time = time.perf_counter()
+    exact = [set(np.argpartition(-(matrix @ query), k - 1)[:k]) for query in queries]
+    exact_ms = 1000 * (time.perf_counter() - start_time) / len(queries)
+
+    result = []
+    for n_probe in n_probes:
+        found = 0
+        start_time = time.perf_counter()
+        for query, expected in zip(queries, exact):
+            rows = index.candidates(query, n_probe)
+            scores = matrix[rows] @ query
+            top = rows[np.argpartition(-scores, min(k, rows.shape[0]) - 1)[:k]] if rows.shape[0] > k else rows
+            found += len(expected.intersection(top.tolist()))
+        elapsed_ms = 1000 * (time.perf_counter() - start_time) / len(queries)
+
+        result.append((n_probe, found / (k * len(queries)), elapsed_ms, exact_ms))
+
+    return result
+
+# Запуск сравнения на случайных данных: python annindex.py [строк] [размерность]
+if __name__ == '__main__':
+    import sys
+
+    row_count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    dim = int(sys.argv[2]) if len(sys.argv) > 2 else 312
+
+    # Данные с кластерной структурой, как у эмбеддингов текстов
+    rng = np.random.default_rng(0)
+    centers = rng.standard_normal((row_count // 50, dim)).astype(np.float32)
+    matrix = centers[rng.integers(0, centers.shape[0], row_count)] + 0.5 * rng.standard_normal((row_count, dim)).astype(np.float32)
+    matrix /= np.linalg.norm(matrix, axis=1, keepdims=True)
+    queries = matrix[rng.choice(row_count, 200, replace=False)] + 0.1 * rng.standard_normal((200, dim)).astype(np.float32)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+
+    print(f'Строк {row_count}, размерность {dim}')
+    for n_probe, recall, ann_ms, exact_ms in benchmark_ivf_index(matrix, queries):
+        print(f'n_probe={n_probe:3d}  recall@10={recall:.3f}  {ann_ms:.2f} мс (точный поиск {exact_ms:.2f} мс)')
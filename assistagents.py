@@ -1,5 +1,6 @@
 from enum import Enum
 import json
+import numpy as np
 
 import os
 import subprocess
@@ -7,11 +8,12 @@ import subprocess
 from gigachat.models import Function
 from gigachat.models.function_parameters import FunctionParameters
 
-from agents import AIAgentMessage, BaseAIFunctions, BaseAIAgent
-from funcdb import function_details
+from agents import ANY_REPLY_TO, AIAgentMessage, BaseAIFunctions, BaseAIAgent
+from dialogdb import launched_function_id
+from funcdb import function_details, function_id_by_name
 from gigagents import BaseGigaChatAIAgent, default_model_name
-from semsearch import RubertTiny2SemanticSearch
-from utilities import main_folder, config_value, main_logger
+from semsearch import BaseSemanticSearch, semantic_search
+from utilities import config_bool, config_float, main_folder, main_logger
 
 # Перечисление дополнительных типов функций
 class AIFunctions(Enum):
@@ -73,6 +75,13 @@ class AssistantAgent(BaseGigaChatAIAgent):
         # Инициализация как у базового класса
         super().__init__(system_prompt, model, [function_launch_app])
 
+    # Маршруты: запрос поиска программы и ответ функции запуска на наш вызов
+    def routes(self) -> list[tuple]:
+        return [
+            (AIFunctions.search_app, False, ANY_REPLY_TO),
+            (AIFunctions.launch_app, True, self.__class__.__name__)
+        ]
+
     # Возможность дать ответ
     def can_handle(self, question: AIAgentMessage) -> float:
         # Если это ответ на запрос функции - можем обработать
@@ -92,7 +101,7 @@ class AssistantAgent(BaseGigaChatAIAgent):
             raise Exception("Невозможно обработать запрос")
 
         # Логгирование на уровне отладки
-        self._logger.debug(f"Объект: {self.__class__.__name__}\n Запрос: {question}")
+        self._logger.debug("Объект: %s\n Запрос: %s", self.__class__.__name__, question)
 
         # Если это запрос от пользователя - отвечаем
         if question.function == AIFunctions.search_app:
@@ -148,7 +157,7 @@ class AssistantAgent(BaseGigaChatAIAgent):
         answer.reply_to = self.__class__.__name__
 
         # Логгирование на уровне отладки
-        self._logger.debug(f"Объект: {self.__class__.__name__}\n Ответ: {answer}")
+        self._logger.debug("Объект: %s\n Ответ: %s", self.__class__.__name__, answer)
 
         return answer
 
@@ -157,14 +166,71 @@ class AssistantAgent(BaseGigaChatAIAgent):
         super().clear_context()
         self._trial_count = 0
 
+# Лучшая функция семантического поиска, ее близость и отрыв от следующей: (id, близость, отрыв) или None
+def _top_score_margin(scored: list[tuple[int, float]]) -> tuple[int, float, float] | None:
+    if not scored:
+        return None
+
+    top_id, top_score = scored[0]
+    margin = top_score - scored[1][1] if len(scored) > 1 else top_score
+    return top_id, top_score, margin
+
+# Подбор порогов быстрого запуска по истории диалогов со статусом: (min_score, min_margin) или None
+# Из пар порогов, при которых доля верных запусков не ниже min_precision, выбирается пара с наибольшим охватом
+def calibrate_fast_path(searcher: BaseSemanticSearch, dialogs: list[dict], min_precision: float = 0.95,
+                        min_samples: int = 20) -> tuple[float, float] | None:
+    # Эмбеддинги всех запросов - одним пакетом
+    embeddings = searcher.embeddings([dialog['user_query'] for dialog in dialogs])
+
+    scores = []
+    margins = []
+    correct = []
+    for dialog, embedding in zip(dialogs, embeddings):
+        # Запрос решенного диалога сохранен промптом функции - без него оценка совпала бы сама с собой
+        top = _top_score_margin(searcher.embedding_semantic_ids(embedding, 2, exclude_prompt_text=dialog['user_query']))
+        if top is None:
+            continue
+
+        # Верно - диалог решен запуском той же функции, что нашел поиск
+        top_id, top_score, margin = top
+        scores.append(top_score)
+        margins.append(margin)
+        correct.append(bool(dialog['solved']) and launched_function_id(dialog['ai_response']) == top_id)
+
+    if len(scores) < min_samples:
+        return None
+
+    scores = np.array(scores)
+    margins = np.array(margins)
+    correct = np.array(correct)
+
+    # Кандидаты порогов - квантили наблюдаемых значений
+    best = None
+    best_coverage = 0
+    quantiles = np.linspace(0.0, 1.0, 21)
+    for min_score in np.quantile(scores, quantiles):
+        for min_margin in np.quantile(margins, quantiles):
+            accepted = (scores >= min_score) & (margins >= min_margin)
+            coverage = int(accepted.sum())
+            if coverage > best_coverage and correct[accepted].mean() >= min_precision:
+                best = (round(float(min_score), 3), round(float(min_margin), 3))
+                best_coverage = coverage
+
+    return best
+
 # Агент по составлению списка программ
+# Уверенное совпадение (точное имя или высокая близость с отрывом) отправляется на запуск сразу, без LLM
 class AppListAgent(BaseAIAgent):
     def __init__(self):
         # Получение логгер
         self._logger = main_logger()
 
         # Создаем объект для семантического поиска
-        self._searcher = RubertTiny2SemanticSearch()
+        self._searcher = semantic_search()
+
+    # Маршруты: запрос пользователя
+    def routes(self) -> list[tuple]:
+        return [(BaseAIFunctions.content, False, ANY_REPLY_TO)]
 
     # Возможность дать ответ
     def can_handle(self, question: AIAgentMessage) -> float:
@@ -180,23 +246,56 @@ class AppListAgent(BaseAIAgent):
             raise Exception("Невозможно обработать запрос")
         
         # Логгирование на уровне отладки
-        self._logger.debug(f"Объект: {self.__class__.__name__}\n Запрос: {question}")
-
-        # Получение списка программ и формирования сообщения
-        answer_data = {
-            'app_list': self._searcher.functions(question.content),
-            'prompt': question.content
-        }
+        self._logger.debug("Объект: %s\n Запрос: %s", self.__class__.__name__, question)
 
         answer = AIAgentMessage()
-        answer.function = AIFunctions.search_app
-        answer.content = answer_data
+
+        # Быстрый путь: запуск функции без обращения к GigaChat
+        function_id = self._fast_path_function_id(question.content)
+        if function_id is not None:
+            answer.function = AIFunctions.launch_app
+            answer.content = str(function_id)
+            answer.reply_to = AssistantAgent.__name__
+
+        # Получение списка программ и формирования сообщения
+        else:
+            answer.function = AIFunctions.search_app
+            answer.content = {
+                'app_list': self._searcher.functions(question.content),
+                'prompt': question.content
+            }
 
         # Логгирование на уровне отладки
-        self._logger.debug(f"Объект: {self.__class__.__name__}\n Ответ: {answer}")
+        self._logger.debug("Объект: %s\n Ответ: %s", self.__class__.__name__, answer)
 
         return answer
 
+    # Функция для быстрого запуска (None - нужен выбор LLM)
+    def _fast_path_function_id(self, prompt: str) -> int | None:
+        if not config_bool(None, 'FAST_PATH', 'enabled', False):
+            return None
+
+        # Точное совпадение с именем функции
+        function_id = function_id_by_name(prompt)
+        if function_id is not None:
+            return function_id
+
+        # Пороги близости действуют только после подбора по истории диалогов
+        if not config_bool(None, 'FAST_PATH', 'calibrated', False):
+            return None
+
+        # Высокая близость и отрыв от следующей функции (эмбеддинг запроса кэшируется для полного поиска)
+        top = _top_score_margin(self._searcher.semantic_ids(prompt, 2))
+        if top is None:
+            return None
+
+        top_id, top_score, margin = top
+        if (top_score >= config_float(None, 'FAST_PATH', 'min_score', 0.8)
+                and margin >= config_float(None, 'FAST_PATH', 'min_margin', 0.1)):
+            return top_id
+
+        return None
+
     # Очистка контекста
     def clear_context(self):
         pass
@@ -207,6 +306,10 @@ class LaunchAppAgent(BaseAIAgent):
         self._logger = main_logger()
         self.clear_context()
 
+    # Маршруты: вызов функции запуска программы
+    def routes(self) -> list[tuple]:
+        return [(AIFunctions.launch_app, False, ANY_REPLY_TO)]
+
     # Возможность дать ответ
     def can_handle(self, question: AIAgentMessage) -> float:
         # Если это запрос нашей функции - отвечаем
@@ -221,7 +324,7 @@ class LaunchAppAgent(BaseAIAgent):
             raise Exception("Невозможно обработать запрос")
 
         # Логгирование на уровне отладки
-        self._logger.debug(f"Объект: {self.__class__.__name__}\n Запрос: {question}")
+        self._logger.debug("Объект: %s\n Запрос: %s", self.__class__.__name__, question)
 
         # Получение информации о приложении
         row = function_details(int(question.content))
@@ -251,7 +354,7 @@ class LaunchAppAgent(BaseAIAgent):
             answer.reply_to = question.reply_to
 
         # Логгирование на уровне отладки
-        self._logger.debug(f"Объект: {self.__class__.__name__}\n Ответ: {answer}")
+        self._logger.debug("Объект: %s\n Ответ: %s", self.__class__.__name__, answer)
 
         return answer
 
@@ -0,0 +1,274 @@
+import os
+
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import json
+import random
+import threading
+import time
+from tqdm import tqdm
+
+from funcdb import FUNCTION_SOURCE_OS, SKIPPED_APP_DELETED, delete_function, function_sources, function_type_id, mark_apps_failed, mark_functions_imported, save_functions, skipped_apps
+from gigagents import new_app_description, new_apps_descriptions
+from llmcache import llm_response_cache
+from osinfo import app_info_hash
+from utilities import config_float, config_int, config_str, main_folder, main_logger
+
+# Ограничение частоты запросов: не чаще одного запроса в заданный интервал
+class _RateLimiter:
+    def __init__(self, requests_per_minute: float):
+        self._interval = 60.0 / requests_per_minute if requests_per_minute > 0 else 0.0
+        self._lock = threading.Lock()
+        self._next_time = 0.0
+
+    # Ожидание разрешения на запрос
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            delay = self._next_time - now
+            self._next_time = max(now, self._next_time) + self._interval
+
+        if delay > 0:
+            time.sleep(delay)
+
+# Выполнение операции с повторами и экспоненциальной задержкой
+def _with_retries(operation, rate_limiter: _RateLimiter, max_retries: int, backoff: float):
+    attempt = 0
+    while True:
+        rate_limiter.wait()
+        try:
+            return operation()
+
+        except Exception:
+            attempt += 1
+            if attempt > max_retries:
+                raise
+
+            # Задержка растет вдвое с каждой попыткой, случайная добавка разносит повторы потоков
+            time.sleep(backoff * 2 ** (attempt - 1) + random.uniform(0, backoff))
+
+# Описания "пачки" программ: ([(app_info, description), ...], [app_info программ без ответа LLM, ...])
+def _describe_batch(batch: list[dict], rate_limiter: _RateLimiter, max_retries: int, backoff: float) -> tuple[list[tuple[dict, str | None]], list[dict]]:
+    logger = main_logger()
+
+    # Сначала вся "пачка" одним запросом
+    if len(batch) > 1:
+        try:
+            descriptions = _with_retries(lambda: new_apps_descriptions(batch), rate_limiter, max_retries, backoff)
+            return list(zip(batch, descriptions)), []
+
+        except Exception as e:
+            logger.warning(f'Не удалось получить описания пачки программ, запрашиваем по одной: {e}')
+
+    # Не получилось - запрашиваем по одной программе
+    described = []
+    failed = []
+    for app_info in batch:
+        try:
+            response = _with_retries(lambda: new_app_description(app_info), rate_limiter, max_retries, backoff)
+            described.append((app_info, json.loads(response)['description']))
+
+        # Повторы исчерпаны - программа отмечается, синхронизация не будет запрашивать ее каждый раз
+        except Exception as e:
+            logger.error(f'Ошибка получения описания программы {app_info.get("name")}: {e}')
+            failed.append(app_info)
+
+    return described, failed
+
+# Путь к файлу прогресса заполнения базы функций
+def _progress_file_path() -> str:
+    file_name = config_str(None, 'BOOTSTRAP', 'progress_file_name', 'bootstrap_progress.json')
+    return os.path.join(main_folder(), file_name)
+
+# Загрузка команд уже обработанных программ
+def _load_progress(progress_path: str) -> set[str]:
+    try:
+        if os.path.exists(progress_path):
+            with open(progress_path, 'r', encoding='utf-8') as f:
+                return set(json.load(f))
+
+    except Exception as e:
+        main_logger().warning(f'Ошибка загрузки прогресса заполнения базы функций: {e}')
+
+    return set()
+
+# Сохранение команд обработанных программ (через временный файл, чтобы не повредить при прерывании)
+def _save_progress(progress_path: str, done_commands: set[str]):
+    temp_path = f'{progress_path}.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(sorted(done_commands), f, ensure_ascii=False)
+    os.replace(temp_path, progress_path)
+
+# Описания программ от LLM "пачками" в пуле потоков
+# Для каждой обработанной "пачки" вызывается handle_batch(batch, [(app_info, description), ...]),
+# программы без ответа LLM отмечаются в базе функций
+# При установке cancel_event "пачки" в очереди отменяются, уже запрошенные - дожидаются и обрабатываются
+def _describe_apps(app_list: list[dict], handle_batch, progress_title: str | None = None, cancel_event: threading.Event | None = None):
+    logger = main_logger()
+
+    # Параметры конвейера
+    batch_size = max(1, config_int(None, 'BOOTSTRAP', 'batch_size', 20))
+    max_workers = max(1, config_int(None, 'BOOTSTRAP', 'max_workers', 4))
+    requests_per_minute = config_float(None, 'BOOTSTRAP', 'requests_per_minute', 60)
+    max_retries = config_int(None, 'BOOTSTRAP', 'max_retries', 3)
+    backoff = config_float(None, 'BOOTSTRAP', 'retry_backoff', 2.0)
+
+    rate_limiter = _RateLimiter(requests_per_minute)
+    batches = [app_list[i:i + batch_size] for i in range(0, len(app_list), batch_size)]
+
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='bootstrap') as executor:
+        futures = {
+            executor.submit(_describe_batch, batch, rate_limiter, max_retries, backoff): batch
+            for batch in batches
+        }
+
+        # Индикатор выполнения - только при заголовке
+        with tqdm(total=len(app_list), desc=progress_title, disable=progress_title is None) as progress_bar:
+            for future in as_completed(futures):
+                # Отмена (завершение приложения) - проверяем между "пачками"
+                if cancel_event is not None and cancel_event.is_set():
+                    for pending_future in futures:
+                        pending_future.cancel()
+                if future.cancelled():
+                    continue
+
+                batch = futures[future]
+                try:
+                    described, failed = future.result()
+                    handle_batch(batch, described)
+                    mark_apps_failed(
+                        [(app_info['command'], app_info_hash(app_info)) for app_info in failed],
+                        [app_info['command'] for app_info, _ in described]
+                    )
+
+                except Exception as e:
+                    logger.error(f'Ошибка заполнения базы функций: {e}')
+
+                progress_bar.update(len(batch))
+
+# Запись описанных программ в базу функций как импортированных, результат - количество записанных
+def _save_described_apps(described: list[tuple[dict, str | None]]) -> int:
+    launch_app_id = function_type_id('Launch application')
+
+    # Запись "пачки" одной транзакцией
+    apps = [(app_info, description) for app_info, description in described if description]
+    if not apps:
+        return 0
+
+    function_ids = save_functions(
+        [(app_info['name'], launch_app_id, description, app_info['command']) for app_info, description in apps],
+        [app_info_hash(app_info) for app_info, _ in apps]
+    )
+    return sum(1 for id_ in function_ids if id_ is not None)
+
+# Заполнение базы функций описаниями программ от LLM
+# Прерванное заполнение продолжается с места остановки, результат - обработаны ли все программы
+# cancel_event прерывает заполнение между "пачками"
+def bootstrap_functions(app_list: list[dict], cancel_event: threading.Event | None = None) -> bool:
+    logger = main_logger()
+
+    # Пропускаем программы, обработанные до прерывания
+    progress_path = _progress_file_path()
+    done_commands = _load_progress(progress_path)
+    pending = [app_info for app_info in app_list if app_info['command'] not in done_commands]
+
+    saved_count = 0
+
+    def handle_batch(batch: list[dict], described: list[tuple[dict, str | None]]):
+        nonlocal saved_count
+        saved_count += _save_described_apps(described)
+
+        # Фиксируем прогресс только после записи в базу (программы без описания тоже, их можно добавить в редакторе,
+        # программы без ответа LLM повторит синхронизация)
+        done_commands.update(app_info['command'] for app_info in batch)
+        _save_progress(progress_path, done_commands)
+
+    _describe_apps(pending, handle_batch, 'Заполнение базы функций операционной системы', cancel_event)
+
+    logger.info(f'Заполнение базы функций: записано {saved_count} из {len(pending)}')
+    llm_response_cache().log_stats()
+
+    # Все обработано - прогресс больше не нужен
+    completed = all(app_info['command'] in done_commands for app_info in app_list)
+    if completed and os.path.exists(progress_path):
+        os.remove(progress_path)
+
+    return completed
+
+# Синхронизация базы функций со списком программ ОС по командам запуска:
+# новые программы добавляются, у измененных обновляются имя и описание, функции удаленных программ удаляются.
+# Описания LLM запрашиваются только для новых и измененных программ, функции пользователя не изменяются.
+# Программы, функции которых удалил пользователь, не добавляются; программы без ответа LLM повторяются
+# после изменения или через заданное время
+# Результат - количество добавленных, обновленных и удаленных функций, cancel_event прерывает запрос описаний
+def sync_functions(app_list: list[dict], cancel_event: threading.Event | None = None) -> tuple[int, int, int]:
+    logger = main_logger()
+
+    apps = {}
+    for app_info in app_list:
+        apps.setdefault(app_info['command'], app_info)
+
+    sources = function_sources()
+    skipped = skipped_apps()
+    retry_after = config_float(None, 'APP_SYNC', 'failed_retry_hours', 24) * 3600
+
+    # Пропуск программы: функция удалена пользователем или программа без изменений недавно осталась без ответа LLM
+    def is_skipped(command: str, app_hash: str) -> bool:
+        reason, failed_hash, timestamp = skipped.get(command, (None, None, 0))
+        return reason == SKIPPED_APP_DELETED or (failed_hash == app_hash and time.time() - timestamp < retry_after)
+
+    new_apps = []
+    changed_apps = []
+    adopted = [] # Функции, созданные до учета источника, по программам из списка
+    skipped_count = 0
+    for command, app_info in apps.items():
+        app_hash = app_info_hash(app_info)
+        function_id, source, old_hash = sources.get(command, (None, None, None))
+
+        if function_id is None or (source == FUNCTION_SOURCE_OS and old_hash != app_hash):
+            if is_skipped(command, app_hash):
+                skipped_count += 1
+            elif function_id is None:
+                new_apps.append(app_info)
+            else:
+                changed_apps.append(app_info)
+        elif source is None:
+            adopted.append((function_id, app_hash))
+
+    if adopted:
+        mark_functions_imported(adopted)
+
+    # Функции программ, которых больше нет в списке
+    imported_ids = [function_id for function_id, source, _ in sources.values() if source == FUNCTION_SOURCE_OS]
+    retired_ids = [
+        function_id for command, (function_id, source, _) in sources.items()
+        if source == FUNCTION_SOURCE_OS and command not in apps
+    ]
+
+    # Исчезновение большой доли программ скорее ошибка чтения списка, чем удаление программ
+    max_retire_share = config_float(None, 'APP_SYNC', 'max_retire_share', 0.5)
+    if len(retired_ids) > max_retire_share * len(imported_ids):
+        logger.warning(f'Синхронизация программ: не удаляем {len(retired_ids)} из {len(imported_ids)} функций, слишком много за раз')
+        retired_ids = []
+
+    # Программы нет в ОС - при повторной установке функция будет добавлена снова
+    for function_id in retired_ids:
+        delete_function(function_id, remember_deleted=False)
+
+    # Описания только для новых и измененных программ
+    new_commands = {app_info['command'] for app_info in new_apps}
+    saved = {'new': 0, 'changed': 0}
+
+    def handle_batch(batch: list[dict], described: list[tuple[dict, str | None]]):
+        saved['new'] += _save_described_apps([item for item in described if item[0]['command'] in new_commands])
+        saved['changed'] += _save_described_apps([item for item in described if item[0]['command'] not in new_commands])
+
+    if new_apps or changed_apps:
+        _describe_apps(new_apps + changed_apps, handle_batch, cancel_event=cancel_event)
+
+    logger.info(
+        f'Синхронизация программ: добавлено {saved["new"]} из {len(new_apps)}, '
+        f'обновлено {saved["changed"]} из {len(changed_apps)}, удалено {len(retired_ids)}, '
+        f'отмечено импортированными {len(adopted)}, пропущено {skipped_count}'
+    )
+
+    return saved['new'], saved['changed'], len(retired_ids)
@@ -0,0 +1,156 @@
+import os
+
+from datetime import datetime
+import json
+import re
+
+import sqlite3
+
+from utilities import config_value, main_folder, main_logger
+
+# Идентификатор запущенной функции из ответа AI-асистента ("id: N" в последней строке), None - не найден
+def launched_function_id(ai_response: str | None) -> int | None:
+    if not ai_response:
+        return None
+
+    last_line = ai_response.strip().split('\n')[-1].strip().lower()
+    match = re.search(r'\bid[:\s]*(\d+)', last_line)
+    return int(match.group(1)) if match else None
+
+# История диалогов в базе SQLite: добавление и смена статуса не перезаписывают историю
+class DialogHistory:
+    def __init__(self):
+        # Получение логгера
+        self._logger = main_logger()
+
+        # Установка имени файла истории
+        history_file_name = config_value(None, 'DIALOG_HISTORY', 'file_name')
+        if history_file_name is None:
+            raise Exception('Не указан файл истории диалогов')
+
+        # Прежний формат истории - JSON-файл, база данных рядом с ним
+        base_path, extension = os.path.splitext(os.path.join(main_folder(), history_file_name))
+        self.history_file_path = f'{base_path}.db' if extension.lower() == '.json' else base_path + extension
+        legacy_file_path = f'{base_path}.json'
+
+        # Открытие базы данных истории
+        self._connection = sqlite3.connect(self.history_file_path)
+        self._connection.execute('PRAGMA journal_mode = WAL')
+        self._connection.execute("""
+            CREATE TABLE IF NOT EXISTS dialogs (
+                id INTEGER PRIMARY KEY,
+                timestamp TEXT NOT NULL,
+                user_query TEXT NOT NULL,
+                ai_response TEXT,
+                solved INTEGER
+            )"""
+        )
+        self._connection.commit()
+
+        # Перенос истории из JSON-файла
+        self._try_migrate_json(legacy_file_path)
+
+    # Перенос истории из JSON-файла прежнего формата
+    def _try_migrate_json(self, legacy_file_path: str):
+        if not os.path.exists(legacy_file_path):
+            return
+
+        try:
+            with open(legacy_file_path, 'r', encoding='utf-8') as f:
+                dialogs = json.load(f)
+
+            with self._connection:
+                self._connection.executemany(
+                    '''INSERT OR IGNORE INTO dialogs (id, timestamp, user_query, ai_response, solved)
+                       VALUES (?, ?, ?, ?, ?)''',
+                    [
+                        (d['id'], d['timestamp'], d['user_query'], d.get('ai_response'), d.get('solved'))
+                        for d in dialogs
+                    ]
+                )
+
+            # Старый файл сохраняем под другим именем, чтобы не переносить повторно
+            os.replace(legacy_file_path, f'{legacy_file_path}.migrated')
+
+        except Exception as e:
+            # Логгирование на уровне отладки
+            self._logger.debug(f"Ошибка переноса истории: {e}")
+
+    # Диалог из строки таблицы
+    @staticmethod
+    def _dialog_from_row(row) -> dict:
+        dialog_id, timestamp, user_query, ai_response, solved = row
+        return {
+            'id': dialog_id,
+            'timestamp': timestamp,
+            'user_query': user_query,
+            'ai_response': ai_response,
+            'solved': None if solved is None else bool(solved)  # None, True, False
+        }
+
+    # Добавление нового диалога
+    def add_dialog(self, user_query, ai_response, solved=None):
+        timestamp = datetime.now().isoformat()
+
+        try:
+            with self._connection:
+                cursor = self._connection.execute(
+                    'INSERT INTO dialogs (timestamp, user_query, ai_response, solved) VALUES (?, ?, ?, ?)',
+                    (timestamp, user_query, ai_response, solved)
+                )
+
+        except Exception as e:
+            raise Exception(f"Ошибка сохранения истории: {e}")
+
+        return self._dialog_from_row((cursor.lastrowid, timestamp, user_query, ai_response, solved))
+
+    # Установка статуса диалога
+    def set_dialog_solved(self, dialog_id, solved):
+        try:
+            with self._connection:
+                cursor = self._connection.execute('UPDATE dialogs SET solved = ? WHERE id = ?', (solved, dialog_id))
+
+        except Exception as e:
+            raise Exception(f"Ошибка сохранения истории: {e}")
+
+        return cursor.rowcount > 0
+
+    # Диалог по идентификатору
+    def dialog(self, dialog_id):
+        row = self._connection.execute(
+            'SELECT id, timestamp, user_query, ai_response, solved FROM dialogs WHERE id = ?', (dialog_id,)
+        ).fetchone()
+
+        return self._dialog_from_row(row) if row else None
+
+    # Список последних диалогов (читается только "хвост" истории)
+    def recent_dialogs(self, count=10):
+        rows = self._connection.execute(
+            'SELECT id, timestamp, user_query, ai_response, solved FROM dialogs ORDER BY id DESC LIMIT ?', (count,)
+        ).fetchall()
+
+        return [self._dialog_from_row(row) for row in reversed(rows)]
+
+    # Диалоги с установленным статусом (решен или нет), от новых к старым
+    def solved_dialogs(self, count: int | None = None):
+        rows = self._connection.execute(
+            'SELECT id, timestamp, user_query, ai_response, solved FROM dialogs WHERE solved IS NOT NULL ORDER BY id DESC LIMIT ?',
+            (-1 if count is None else count,)
+        ).fetchall()
+
+        return [self._dialog_from_row(row) for row in rows]
+
+    # Сжатие истории: оставляем keep_last последних диалогов (None - все) и освобождаем место в файле
+    def compact(self, keep_last: int | None = None):
+        try:
+            if keep_last is not None:
+                with self._connection:
+                    self._connection.execute(
+                        'DELETE FROM dialogs WHERE id NOT IN (SELECT id FROM dialogs ORDER BY id DESC LIMIT ?)',
+                        (keep_last,)
+                    )
+
+            self._connection.execute('VACUUM')
+
+        except Exception as e:
+            raise Exception(f"Ошибка сжатия истории: {e}")
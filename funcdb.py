@@ -1,12 +1,15 @@
 import os
+import threading
 
-import heapq
+import hashlib
 import json
 import numpy as np
+import re
 
 import sqlite3
 
-from utilities import config_value, main_folder
+from annindex import load_or_build_ivf_index
+from utilities import config_bool, config_int, config_value, main_folder
 
 # Путь к базе данных функций
 def functions_db_path() -> str:
@@ -18,22 +21,63 @@ def functions_db_path() -> str:
     # Путь к файлу базы данных
     return os.path.join(main_folder(), functions_db_name)
 
+# Соединения с базой данных функций: у каждого потока свои, живут до конца потока
+_DB_LOCAL = threading.local()
+
+# Базы данных с уже инициализированной схемой (инициализация - один раз за процесс)
+_DB_INITIALIZED = set()
+_DB_INIT_LOCK = threading.Lock()
+
+# Настройка нового соединения
+def _configure_connection(connection):
+    # WAL: читатели не блокируют писателя (UI, трей и фоновые потоки)
+    connection.execute('PRAGMA journal_mode = WAL')
+    connection.execute('PRAGMA synchronous = NORMAL')
+    connection.execute('PRAGMA temp_store = MEMORY')
+    connection.execute('PRAGMA cache_size = -16000')
+
 # Соединение с базой данных функций
 def _functions_db_connection():
     # Путь к файлу базы данных
     db_path = functions_db_path()
-    if not os.path.exists(db_path):
-        raise Exception("База данных функций не найдена")
 
-    return sqlite3.connect(db_path)
+    # Соединения текущего потока по пути к базе данных
+    connections = getattr(_DB_LOCAL, 'connections', None)
+    if connections is None:
+        connections = _DB_LOCAL.connections = {}
 
-# Курсор базы данных
-def _functions_db_cursor(connection):
-    cursor = connection.cursor()
+    connection = connections.get(db_path)
+    if connection is None:
+        if not os.path.exists(db_path):
+            raise Exception("База данных функций не найдена")
+
+        connection = sqlite3.connect(db_path, timeout=30.0)
+        _configure_connection(connection)
+
+        # Инициализация схемы один раз за процесс
+        with _DB_INIT_LOCK:
+            if db_path not in _DB_INITIALIZED:
+                _try_init_functions_db(connection.cursor())
+                connection.commit()
+                _DB_INITIALIZED.add(db_path)
+
+        connections[db_path] = connection
 
-    _try_init_functions_db(cursor)
+    return connection
 
-    return cursor
+# Закрытие соединений текущего потока
+def close_functions_db_connections():
+    connections = getattr(_DB_LOCAL, 'connections', None)
+    if not connections:
+        return
+
+    for connection in connections.values():
+        connection.close()
+    connections.clear()
+
+# Курсор базы данных
+def _functions_db_cursor(connection):
+    return connection.cursor()
 
 # Инициализация базы данных функций
 def _try_init_functions_db(cursor):
@@ -72,6 +116,8 @@ def _try_init_functions_db(cursor):
                 description TEXT,
                 type_id INTEGER NOT NULL,
                 command TEXT NOT NULL,
+                source VARCHAR(16),
+                app_hash VARCHAR(64),
                 FOREIGN KEY (type_id) REFERENCES function_types(id)
             )"""
         )
@@ -99,30 +145,266 @@ def _try_init_functions_db(cursor):
     )
     if cursor.fetchone() is None:
         # Создание таблицы эмбеддингов
-        cursor.execute("""
-            CREATE TABLE embeddings (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                function_id INTEGER NOT NULL,
-                prompt_id INTEGER,
-                text TEXT NOT NULL,
-                embedding TEXT NOT NULL,
-                FOREIGN KEY (function_id) REFERENCES functions(id),
-                FOREIGN KEY (prompt_id) REFERENCES prompts(id)
+        _create_embeddings_table(cursor)
+
+    # Обновление схемы базы данных до текущей версии
+    _try_upgrade_functions_db(cursor)
+
+# Создание таблицы эмбеддингов
+def _create_embeddings_table(cursor, table_name: str = 'embeddings'):
+    cursor.execute(f"""
+        CREATE TABLE {table_name} (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            function_id INTEGER NOT NULL,
+            prompt_id INTEGER,
+            text TEXT NOT NULL,
+            embedding BLOB NOT NULL,
+            dim INTEGER NOT NULL,
+            dtype VARCHAR(16) NOT NULL,
+            text_hash VARCHAR(64),
+            model TEXT,
+            unit_norm INTEGER NOT NULL DEFAULT 0,
+            FOREIGN KEY (function_id) REFERENCES functions(id),
+            FOREIGN KEY (prompt_id) REFERENCES prompts(id)
+        )"""
+    )
+
+# Список колонок таблицы
+def _table_columns(cursor, table_name: str) -> list[str]:
+    cursor.execute(f'PRAGMA table_info({table_name})')
+    return [row[1] for row in cursor.fetchall()]
+
+# Миграция: эмбеддинги из JSON-текста в двоичный формат
+def _migrate_embeddings_to_blob(cursor):
+    # Таблица уже в новом формате
+    if 'dim' in _table_columns(cursor, 'embeddings'):
+        return
+
+    # Старую таблицу переименовываем и создаем новую
+    cursor.execute('ALTER TABLE embeddings RENAME TO embeddings_json')
+    _create_embeddings_table(cursor)
+
+    # Переносим эмбеддинги "пачками", нечитаемые пропускаем
+    insert_cursor = cursor.connection.cursor()
+    cursor.execute('SELECT id, function_id, prompt_id, text, embedding FROM embeddings_json')
+
+    while True:
+        rows = cursor.fetchmany(1000)
+        if not rows:
+            break
+
+        insert_data = []
+        for emb_id, function_id, prompt_id, text, emb_json in rows:
+            try:
+                insert_data.append((emb_id, function_id, prompt_id, text, *_embedding_to_blob(json.loads(emb_json))))
+
+            except (json.JSONDecodeError, TypeError, ValueError):
+                continue
+
+        insert_cursor.executemany(
+            '''INSERT INTO embeddings (id, function_id, prompt_id, text, embedding, dim, dtype, unit_norm)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?)''',
+            insert_data
+        )
+
+    cursor.execute('DROP TABLE embeddings_json')
+
+# Миграция: хэш текста и модель для инкрементального пересчета эмбеддингов
+def _migrate_embeddings_add_hash(cursor):
+    columns = _table_columns(cursor, 'embeddings')
+    if 'text_hash' not in columns:
+        cursor.execute('ALTER TABLE embeddings ADD COLUMN text_hash VARCHAR(64)')
+    if 'model' not in columns:
+        cursor.execute('ALTER TABLE embeddings ADD COLUMN model TEXT')
+
+# Миграция: признак нормализованного эмбеддинга (прежние строки проверяются при загрузке индекса)
+def _migrate_embeddings_add_unit_norm(cursor):
+    if 'unit_norm' not in _table_columns(cursor, 'embeddings'):
+        cursor.execute('ALTER TABLE embeddings ADD COLUMN unit_norm INTEGER NOT NULL DEFAULT 0')
+
+# Токенизатор полнотекстового индекса: без учета регистра и диакритики (ё = е)
+_FULLTEXT_TOKENIZE = 'unicode61 remove_diacritics 2'
+
+# Миграция: полнотекстовый индекс FTS5 по функциям и промптам, синхронизируется триггерами
+def _migrate_add_fulltext_index(cursor):
+    try:
+        cursor.execute(f"""
+            CREATE VIRTUAL TABLE IF NOT EXISTS functions_fts USING fts5(
+                name, description, command,
+                content='functions', content_rowid='id', tokenize='{_FULLTEXT_TOKENIZE}'
             )"""
         )
+        cursor.execute(f"""
+            CREATE VIRTUAL TABLE IF NOT EXISTS prompts_fts USING fts5(
+                text,
+                content='prompts', content_rowid='id', tokenize='{_FULLTEXT_TOKENIZE}'
+            )"""
+        )
+
+    # SQLite без FTS5 - остается только семантический поиск
+    except sqlite3.OperationalError:
+        return
+
+    # Триггеры индекса функций
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS functions_fts_insert AFTER INSERT ON functions BEGIN
+            INSERT INTO functions_fts (rowid, name, description, command)
+            VALUES (new.id, new.name, new.description, new.command);
+        END"""
+    )
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS functions_fts_delete AFTER DELETE ON functions BEGIN
+            INSERT INTO functions_fts (functions_fts, rowid, name, description, command)
+            VALUES ('delete', old.id, old.name, old.description, old.command);
+        END"""
+    )
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS functions_fts_update AFTER UPDATE ON functions BEGIN
+            INSERT INTO functions_fts (functions_fts, rowid, name, description, command)
+            VALUES ('delete', old.id, old.name, old.description, old.command);
+            INSERT INTO functions_fts (rowid, name, description, command)
+            VALUES (new.id, new.name, new.description, new.command);
+        END"""
+    )
+
+    # Триггеры индекса промптов
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS prompts_fts_insert AFTER INSERT ON prompts BEGIN
+            INSERT INTO prompts_fts (rowid, text) VALUES (new.id, new.text);
+        END"""
+    )
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS prompts_fts_delete AFTER DELETE ON prompts BEGIN
+            INSERT INTO prompts_fts (prompts_fts, rowid, text) VALUES ('delete', old.id, old.text);
+        END"""
+    )
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS prompts_fts_update AFTER UPDATE ON prompts BEGIN
+            INSERT INTO prompts_fts (prompts_fts, rowid, text) VALUES ('delete', old.id, old.text);
+            INSERT INTO prompts_fts (rowid, text) VALUES (new.id, new.text);
+        END"""
+    )
+
+    # Заполнение индекса имеющимися данными
+    cursor.execute("INSERT INTO functions_fts (functions_fts) VALUES ('rebuild')")
+    cursor.execute("INSERT INTO prompts_fts (prompts_fts) VALUES ('rebuild')")
+
+# Источник функции: импортирована из списка программ ОС или создана пользователем (NULL - до миграции)
+FUNCTION_SOURCE_OS = 'os'
+FUNCTION_SOURCE_USER = 'user'
+
+# Миграция: источник функции и хэш описания программы, по которому она импортирована
+def _migrate_functions_add_source(cursor):
+    columns = _table_columns(cursor, 'functions')
+    if 'source' not in columns:
+        cursor.execute('ALTER TABLE functions ADD COLUMN source VARCHAR(16)')
+    if 'app_hash' not in columns:
+        cursor.execute('ALTER TABLE functions ADD COLUMN app_hash VARCHAR(64)')
+
+# Программы ОС, которые синхронизация не добавляет: функция удалена пользователем или описание не получено
+SKIPPED_APP_DELETED = 'deleted'
+SKIPPED_APP_FAILED = 'failed'
+
+# Миграция: программы, пропускаемые синхронизацией (по команде запуска)
+def _migrate_add_skipped_apps(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS skipped_apps (
+            command TEXT PRIMARY KEY,
+            reason VARCHAR(16) NOT NULL,
+            app_hash VARCHAR(64),
+            timestamp INTEGER NOT NULL
+        )"""
+    )
+
+# Миграции схемы базы данных, индекс в списке = версия до миграции
+_FUNCTIONS_DB_MIGRATIONS = [
+    _migrate_embeddings_to_blob,
+    _migrate_embeddings_add_hash,
+    _migrate_embeddings_add_unit_norm,
+    _migrate_add_fulltext_index,
+    _migrate_functions_add_source,
+    _migrate_add_skipped_apps,
+]
+
+# Текущая версия схемы базы данных
+_FUNCTIONS_DB_VERSION = len(_FUNCTIONS_DB_MIGRATIONS)
+
+# Обновление схемы базы данных
+def _try_upgrade_functions_db(cursor):
+    # Версия схемы хранится в заголовке файла базы данных
+    cursor.execute('PRAGMA user_version')
+    version = cursor.fetchone()[0]
+    if version >= _FUNCTIONS_DB_VERSION:
+        return
+
+    # Все миграции выполняем одной транзакцией
+    connection = cursor.connection
+    if connection.in_transaction:
+        connection.commit()
+
+    cursor.execute('BEGIN')
+    try:
+        for migration in _FUNCTIONS_DB_MIGRATIONS[version:]:
+            migration(cursor)
+
+        cursor.execute(f'PRAGMA user_version = {_FUNCTIONS_DB_VERSION}')
+        connection.commit()
+
+    except Exception as e:
+        connection.rollback()
+        raise Exception(f"Ошибка обновления схемы базы данных функций: {e}")
+
+# Тип хранения эмбеддингов: float32, порядок байт little-endian
+_EMBEDDING_DTYPE = np.dtype('<f4').str
+
+# Допустимое отклонение длины нормализованного эмбеддинга от 1
+_UNIT_NORM_TOLERANCE = 1e-3
+
+# Эмбеддинг в двоичное представление единичной длины: (данные, размерность, тип, признак нормализации)
+def _embedding_to_blob(embedding) -> tuple[bytes, int, str, int]:
+    array = np.asarray(embedding, dtype=_EMBEDDING_DTYPE)
+    if array.ndim != 1:
+        raise ValueError("Эмбеддинг должен быть вектором")
+
+    # Нормализуем при записи, поиск - только скалярное произведение
+    norm = np.linalg.norm(array)
+    if norm > 0.0 and abs(norm - 1.0) > _UNIT_NORM_TOLERANCE:
+        array = (array / norm).astype(_EMBEDDING_DTYPE)
+
+    return array.tobytes(), array.shape[0], _EMBEDDING_DTYPE, 1
+
+# Эмбеддинг из двоичного представления (без копирования данных)
+def _embedding_from_blob(blob: bytes, dim: int, dtype: str) -> np.ndarray:
+    array = np.frombuffer(blob, dtype=dtype)
+    if array.shape[0] != dim:
+        raise ValueError("Размерность эмбеддинга не совпадает с сохраненной")
+
+    return array
 
 # Удаление функции
-def delete_function(function_id: int):
+# remember_deleted - запомнить команду, чтобы синхронизация с программами ОС не добавила функцию снова
+def delete_function(function_id: int, remember_deleted: bool = True):
     try:
         with _functions_db_connection() as connection:
             cursor = _functions_db_cursor(connection)
 
-            # Удаляем связанные промпты
+            if remember_deleted:
+                cursor.execute('''
+                    INSERT OR REPLACE INTO skipped_apps (command, reason, app_hash, timestamp)
+                    SELECT command, ?, NULL, CAST(strftime('%s', 'now') AS INTEGER)
+                    FROM functions WHERE id = ? AND command IS NOT NULL AND command != ''
+                ''', (SKIPPED_APP_DELETED, function_id))
+
+            # Удаляем связанные эмбеддинги и промпты
+            cursor.execute('DELETE FROM embeddings WHERE function_id = ?', (function_id,))
             cursor.execute('DELETE FROM prompts WHERE function_id = ?', (function_id,))
             # Удаляем функцию
             cursor.execute('DELETE FROM functions WHERE id = ?', (function_id,))
             
             connection.commit()
+
+        # Убираем функцию из индекса эмбеддингов
+        _EMBEDDING_INDEX.remove_function(function_id)
         
     except Exception as e:
         raise Exception(f"Ошибка удаления функции: {e}")
@@ -133,9 +415,13 @@ def delete_prompt(prompt_id: int):
         with _functions_db_connection() as connection:
             cursor = _functions_db_cursor(connection)
             
-            # Удаляем промпт
+            # Удаляем эмбеддинги промпта и промпт
+            cursor.execute('DELETE FROM embeddings WHERE prompt_id = ?', (prompt_id,))
             cursor.execute('DELETE FROM prompts WHERE id = ?', (prompt_id,))
             connection.commit()
+
+        # Убираем промпт из индекса эмбеддингов
+        _EMBEDDING_INDEX.remove_prompt(prompt_id)
         
     except Exception as e:
         raise Exception(f"Ошибка удаления промпта: {e}")
@@ -176,6 +462,10 @@ def delete_free_embeddings():
                 )
 
             connection.commit()
+
+        # Индекс эмбеддингов загрузится заново
+        if free_ids:
+            _EMBEDDING_INDEX.invalidate()
         
     except Exception as e:
         raise Exception(f'Ошибка удаления "свободных" эмбеддингов: {e}')
@@ -237,6 +527,75 @@ def functions_list(function_ids: list[int] = None) -> list[tuple[int, str, str,
 
     return result
 
+# Условие отбора функций по тексту: полнотекстовый индекс (все слова), без FTS5 - LIKE по полям
+def _functions_filter(cursor, filter_text: str | None) -> tuple[str, list]:
+    if not filter_text or not filter_text.strip():
+        return '1', []
+
+    if _fulltext_available(cursor):
+        match = _fulltext_query(filter_text, 'AND')
+        if match is not None:
+            return 'f.id IN (SELECT rowid FROM functions_fts WHERE functions_fts MATCH ?)', [match]
+
+    pattern = f'%{filter_text.strip()}%'
+    return '(f.name LIKE ? OR f.description LIKE ? OR f.command LIKE ?)', [pattern, pattern, pattern]
+
+# Страница списка функций по возрастанию имени (постраничная выборка по ключу, без OFFSET)
+# after_name - имя последней функции предыдущей страницы (None - первая страница), filter_text - отбор по тексту
+def functions_page(after_name: str | None = None, limit: int = 200,
+                filter_text: str | None = None) -> list[tuple[int, str, str, str, str]]:
+    try:
+        with _functions_db_connection() as connection:
+            cursor = _functions_db_cursor(connection)
+
+            # Имя функции уникально - продолжение страницы по индексу имени
+            condition, params = _functions_filter(cursor, filter_text)
+            if after_name is not None:
+                condition += ' AND f.name > ?'
+                params.append(after_name)
+
+            cursor.execute(f'''
+                SELECT f.id, f.name, f.description, ft.name as type, f.command
+                FROM functions f
+                LEFT JOIN function_types ft ON f.type_id = ft.id
+                WHERE {condition}
+                ORDER BY f.name
+                LIMIT ?
+            ''', params + [limit])
+
+            return cursor.fetchall()
+
+    except Exception as e:
+        raise Exception(f"Ошибка получения списка функций: {e}")
+
+# Проходит ли функция отбор по тексту
+def function_matches_filter(function_id: int, filter_text: str | None) -> bool:
+    try:
+        with _functions_db_connection() as connection:
+            cursor = _functions_db_cursor(connection)
+
+            condition, params = _functions_filter(cursor, filter_text)
+            cursor.execute(f'SELECT 1 FROM functions f WHERE f.id = ? AND {condition}', [function_id] + params)
+
+            return cursor.fetchone() is not None
+
+    except Exception as e:
+        raise Exception(f"Ошибка отбора функции: {e}")
+
+# Количество функций, с отбором по тексту
+def functions_count(filter_text: str | None = None) -> int:
+    try:
+        with _functions_db_connection() as connection:
+            cursor = _functions_db_cursor(connection)
+
+            condition, params = _functions_filter(cursor, filter_text)
+            cursor.execute(f'SELECT COUNT(*) FROM functions f WHERE {condition}', params)
+
+            return cursor.fetchone()[0]
+
+    except Exception as e:
+        raise Exception(f"Ошибка подсчета функций: {e}")
+
 # Список типов функций
 def function_types():
     result = []
@@ -322,127 +681,365 @@ def prompt(prompt_id: int) -> str:
 
     return result
 
+# Хэш текста эмбеддинга
+def _text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
 # Пересчет эмбеддингов
-def rebuild_embeddings(embeddings_operation):
+# В инкрементальном режиме пересчитываются только строки с измененным текстом или моделью
+def rebuild_embeddings(embeddings_operation, model_name: str = None, incremental: bool = True,
+                batch_size: int = 1000) -> int:
+    changed = False
+    encoded_count = 0
+
     try:
         with _functions_db_connection() as connection:
             cursor = _functions_db_cursor(connection)
+
+            # Полный пересчет - удаляем все
+            if not incremental:
+                cursor.execute('DELETE FROM embeddings')
+                changed = cursor.rowcount > 0
+
+            # Имеющиеся эмбеддинги: (function_id, prompt_id) -> (id, хэш текста, модель)
+            existing = {}
+            duplicate_ids = []
+
+            cursor.execute('SELECT id, function_id, prompt_id, text_hash, model FROM embeddings')
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                for emb_id, function_id, prompt_id, text_hash, model in rows:
+                    key = (function_id, prompt_id)
+                    if key in existing:
+                        duplicate_ids.append(emb_id)
+                    else:
+                        existing[key] = (emb_id, text_hash, model)
             
-            # Удаляем все
-            cursor.execute('DELETE FROM embeddings')
-            connection.commit()
-            
-            # Собираем информацию для расчета
+            # Собираем информацию для расчета: описания функций и промпты пользователей
             cursor.execute('''
                 SELECT id as function_id, NULL as prompt_id, description as text
                 FROM functions
-                WHERE description IS NOT NULL'''
+                WHERE description IS NOT NULL
+                UNION ALL
+                SELECT function_id, id, text
+                FROM prompts
+                WHERE text IS NOT NULL AND function_id IS NOT NULL'''
             )
-            # TODO На будущее, для классификатора
-            #cursor.execute('''
-            #    SELECT id as function_id, NULL as prompt_id, description as text
-            #    FROM functions
-            #    WHERE description IS NOT NULL
-            #    UNION ALL
-            #    SELECT function_id, id, text
-            #    FROM prompts
-            #    WHERE text IS NOT NULL'''
-            #)
+
+            # Отбираем тексты, для которых эмбеддинг отсутствует или устарел
+            text_info = []  # (id эмбеддинга или None, function_id, prompt_id, text, хэш текста)
 
             while True:
-                rows = cursor.fetchmany(1000)
+                rows = cursor.fetchmany(batch_size)
                 if not rows:
                     break
 
-                # Собираем всё в списки
-                all_texts = []
-                text_info = []  # (function_id, prompt_id, text)
+                for function_id, prompt_id, text in rows:
+                    text_hash = _text_hash(text)
+                    emb_id, old_hash, old_model = existing.pop((function_id, prompt_id), (None, None, None))
+                    if emb_id is None or old_hash != text_hash or old_model != model_name:
+                        text_info.append((emb_id, function_id, prompt_id, text, text_hash))
 
-                for row in rows:
-                    function_id, prompt_id, text = row
-                    all_texts.append(text)
-                    text_info.append((function_id, prompt_id, text))
+            # Удаляем эмбеддинги удаленных функций и промптов, а также дубликаты
+            obsolete_ids = [emb_id for emb_id, _, _ in existing.values()] + duplicate_ids
+            if obsolete_ids:
+                cursor.executemany('DELETE FROM embeddings WHERE id = ?', [(id_,) for id_ in obsolete_ids])
+                changed = True
+
+            for start in range(0, len(text_info), batch_size):
+                batch = text_info[start:start + batch_size]
 
                 # Вычисялем эмбеддинги по списку
-                all_embeddings = embeddings_operation(all_texts)
+                all_embeddings = embeddings_operation([text for _, _, _, text, _ in batch])
 
-                # Запись вычисленных эмбеддингов
-                insert_data = [
-                    (func_id, prompt_id, text, json.dumps(embedding))
-                    for (func_id, prompt_id, text), embedding in zip(text_info, all_embeddings)
-                ]
+                # Запись вычисленных эмбеддингов в двоичном виде
+                update_data = []
+                insert_data = []
+                for (emb_id, func_id, prompt_id, text, text_hash), embedding in zip(batch, all_embeddings):
+                    blob, dim, dtype, unit_norm = _embedding_to_blob(embedding)
+                    if emb_id is None:
+                        insert_data.append((func_id, prompt_id, text, blob, dim, dtype, unit_norm, text_hash, model_name))
+                    else:
+                        update_data.append((text, blob, dim, dtype, unit_norm, text_hash, model_name, emb_id))
 
                 cursor.executemany(
-                    '''INSERT INTO embeddings (function_id, prompt_id, text, embedding) 
-                       VALUES (?, ?, ?, ?)''',
+                    '''UPDATE embeddings
+                       SET text = ?, embedding = ?, dim = ?, dtype = ?, unit_norm = ?, text_hash = ?, model = ?
+                       WHERE id = ?''',
+                    update_data
+                )
+                cursor.executemany(
+                    '''INSERT INTO embeddings (function_id, prompt_id, text, embedding, dim, dtype, unit_norm, text_hash, model) 
+                       VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)''',
                     insert_data
                 )
+
+                encoded_count += len(batch)
+                changed = True
             
             connection.commit()
 
     except Exception as e:
+        changed = True
         raise Exception(f"Не удалось пересчитать эмбеддинги: {e}")
 
-# Поиск похожих эмбеддингов
-def top_N_similar(query_embedding: list[float], limit: int = 3, batch_size: int = 1000) -> list[tuple[int, float]]:
-    # Нормализуем запрос один раз
-    query_emb = np.array(query_embedding, dtype=np.float32)
-    query_norm = query_emb / np.linalg.norm(query_emb)
-    
-    # Список для хранения только топ-N (экономим память)
-    top_results = []  # [(similarity, id), ...]
-    
-    try:
+    finally:
+        # Индекс эмбеддингов загрузится заново
+        if changed:
+            _EMBEDDING_INDEX.invalidate()
+
+    return encoded_count
+
+# Границы групп строк одной функции в отсортированном по function_id массиве
+def _function_groups(function_ids: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    if function_ids.shape[0] == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+
+    starts = np.flatnonzero(np.r_[True, function_ids[1:] != function_ids[:-1]])
+    return starts, function_ids[starts]
+
+# Индекс эмбеддингов в памяти: нормализованная матрица (N, dim) и массивы id
+# Строки упорядочены по function_id, у функции несколько векторов (описание и промпты)
+class _EmbeddingIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._generation = 0 # Счетчик изменений данных
+        self._matrix = None # Нормализованные эмбеддинги float32
+        self._function_ids = None # id функций строк матрицы
+        self._prompt_ids = None # id промптов строк матрицы (-1 - описание функции)
+        self._group_starts = None # Первые строки групп функций
+        self._group_ids = None # id функций групп
+        self._ann = None # Приближенный индекс (None - точный поиск)
+
+    # Сброс индекса, загрузка заново при следующем поиске
+    def invalidate(self):
+        with self._lock:
+            self._generation += 1
+            self._matrix = None
+            self._function_ids = None
+            self._prompt_ids = None
+            self._group_starts = None
+            self._group_ids = None
+            self._ann = None
+
+    # Удаление строк индекса по маске
+    def _remove(self, mask_operation):
+        with self._lock:
+            self._generation += 1
+            if self._matrix is None:
+                return
+
+            # Порядок строк сохраняется, пересчитываются только границы групп
+            keep = ~mask_operation()
+            self._matrix = np.ascontiguousarray(self._matrix[keep])
+            self._function_ids = self._function_ids[keep]
+            self._prompt_ids = self._prompt_ids[keep]
+            self._group_starts, self._group_ids = _function_groups(self._function_ids)
+            if self._ann is not None:
+                self._ann = self._ann.reassigned(self._matrix)
+
+    # Удаление эмбеддингов функции
+    def remove_function(self, function_id: int):
+        self._remove(lambda: self._function_ids == function_id)
+
+    # Удаление эмбеддинга промпта
+    def remove_prompt(self, prompt_id: int):
+        self._remove(lambda: self._prompt_ids == prompt_id)
+
+    # Загрузка эмбеддингов из базы данных
+    def _load(self, batch_size: int):
+        function_ids = []
+        prompt_ids = []
+        embeddings = []
+        legacy = [] # (номер строки, id эмбеддинга) строк без признака нормализации
+        dim = None
+
         with _functions_db_connection() as connection:
             cursor = _functions_db_cursor(connection)
-         
-            cursor.execute('SELECT function_id, embedding FROM embeddings')
-            
+
+            cursor.execute('SELECT id, function_id, prompt_id, embedding, dim, dtype, unit_norm FROM embeddings')
+
             while True:
                 batch = cursor.fetchmany(batch_size)
                 if not batch:
                     break
-                
-                # Распаковываем "пачку" в два списка за один проход
-                batch_ids = []
-                batch_embeddings = []
-                
-                for emb_id, emb_json in batch:
+
+                for emb_id, function_id, prompt_id, emb_blob, emb_dim, emb_dtype, unit_norm in batch:
                     try:
-                        emb_array = np.array(json.loads(emb_json), dtype=np.float32)
-                        batch_ids.append(emb_id)
-                        batch_embeddings.append(emb_array)
+                        emb_array = _embedding_from_blob(emb_blob, emb_dim, emb_dtype)
+
+                    except (TypeError, ValueError):
+                        continue
 
-                    except (json.JSONDecodeError, ValueError):
+                    # Размерность задает первый прочитанный эмбеддинг
+                    if dim is None:
+                        dim = emb_dim
+                    elif emb_dim != dim:
                         continue
-                
-                if not batch_embeddings:
-                    continue
-                
-                # 2D-массив из списка эмбеддингов
-                batch_embs = np.stack(batch_embeddings)
-                # Нормализуем все эмбеддинги
-                batch_norms = batch_embs / np.linalg.norm(batch_embs, axis=1, keepdims=True)
-                # Скалярное произведение нормализованных вектор = косинус угла
-                similarities = np.dot(batch_norms, query_norm)
-                
-                # Обновляем heap только лучшими результатами
-                for emb_id, sim in zip(batch_ids, similarities):
-                    if len(top_results) < limit:
-                        heapq.heappush(top_results, (sim, emb_id))
-                    elif sim > top_results[0][0]:
-                        heapq.heapreplace(top_results, (sim, emb_id))
+
+                    if not unit_norm:
+                        legacy.append((len(embeddings), emb_id))
+
+                    function_ids.append(function_id)
+                    prompt_ids.append(-1 if prompt_id is None else prompt_id)
+                    embeddings.append(emb_array)
+
+            if not embeddings:
+                return np.empty((0, 0), dtype=np.float32), np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+
+            # Матрица эмбеддингов, записанных нормализованными
+            matrix = np.stack(embeddings).astype(np.float32, copy=False)
+
+            # Прежние строки проверяем и нормализуем один раз, с записью в базу
+            if legacy:
+                self._normalize_legacy(connection, matrix, legacy)
+
+        # Строки одной функции подряд, для агрегации по группам
+        function_ids = np.array(function_ids, dtype=np.int64)
+        order = np.argsort(function_ids, kind='stable')
+        matrix = matrix[order]
+
+        return (
+            np.ascontiguousarray(matrix),
+            function_ids[order],
+            np.array(prompt_ids, dtype=np.int64)[order]
+        )
+
+    # Приближенный индекс для большой матрицы, если включен в настройках
+    @staticmethod
+    def _build_ann(matrix: np.ndarray):
+        if not config_bool(None, 'ANN', 'enabled', False):
+            return None
+        if matrix.shape[0] < config_int(None, 'ANN', 'min_rows', 20000):
+            return None
+
+        # Центроиды хранятся рядом с базой данных функций
+        file_path = f'{os.path.splitext(functions_db_path())[0]}.ann.npz'
+        return load_or_build_ivf_index(matrix, file_path, config_int(None, 'ANN', 'n_probe', 16))
+
+    # Нормализация строк без признака нормализации в матрице и в базе данных
+    @staticmethod
+    def _normalize_legacy(connection, matrix: np.ndarray, legacy: list[tuple[int, int]]):
+        rows = np.array([row for row, _ in legacy], dtype=np.int64)
+        norms = np.linalg.norm(matrix[rows], axis=1)
+
+        # Перезаписываем только векторы, длина которых отличается от 1
+        renormalize = (norms > 0.0) & (np.abs(norms - 1.0) > _UNIT_NORM_TOLERANCE)
+        matrix[rows[renormalize]] /= norms[renormalize, None]
+
+        update_data = []
+        flag_data = []
+        for (row, emb_id), changed in zip(legacy, renormalize):
+            if changed:
+                update_data.append((matrix[row].astype(_EMBEDDING_DTYPE).tobytes(), _EMBEDDING_DTYPE, emb_id))
+            else:
+                flag_data.append((emb_id,))
+
+        cursor = _functions_db_cursor(connection)
+        cursor.executemany('UPDATE embeddings SET embedding = ?, dtype = ?, unit_norm = 1 WHERE id = ?', update_data)
+        cursor.executemany('UPDATE embeddings SET unit_norm = 1 WHERE id = ?', flag_data)
+        connection.commit()
+
+    # Матрица, id функций и промптов строк, первые строки групп функций, id функций групп
+    # и приближенный индекс или None (загрузка при необходимости)
+    def arrays(self, batch_size: int = 1000) -> tuple:
+        with self._lock:
+            if self._matrix is not None:
+                return self._matrix, self._function_ids, self._prompt_ids, self._group_starts, self._group_ids, self._ann
+            generation = self._generation
+
+        matrix, function_ids, prompt_ids = self._load(batch_size)
+        group_starts, group_ids = _function_groups(function_ids)
+        ann = self._build_ann(matrix)
+
+        # Сохраняем, только если данные не менялись во время загрузки
+        with self._lock:
+            if generation == self._generation:
+                self._matrix = matrix
+                self._function_ids = function_ids
+                self._prompt_ids = prompt_ids
+                self._group_starts = group_starts
+                self._group_ids = group_ids
+                self._ann = ann
+
+        return matrix, function_ids, prompt_ids, group_starts, group_ids, ann
+
+# Экземпляр индекса эмбеддингов
+_EMBEDDING_INDEX = _EmbeddingIndex()
+
+# Загрузка индекса эмбеддингов заранее, чтобы первый поиск не ждал
+def load_embedding_index(batch_size: int = 1000):
+    try:
+        _EMBEDDING_INDEX.arrays(batch_size)
+
+    except Exception as e:
+        raise Exception(f"Ошибка загрузки индекса эмбеддингов: {e}")
+
+# id промптов с заданным текстом (по хэшу текста эмбеддинга)
+def _prompt_ids_by_text(text: str) -> list[int]:
+    with _functions_db_connection() as connection:
+        cursor = _functions_db_cursor(connection)
+        cursor.execute(
+            'SELECT prompt_id FROM embeddings WHERE text_hash = ? AND prompt_id IS NOT NULL', (_text_hash(text),)
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+# Поиск функций с похожими эмбеддингами, близость функции - лучшее (max) или среднее (mean) по ее векторам
+# exclude_prompt_text - промпты с таким текстом не участвуют в поиске (запрос не находит сам себя)
+def top_N_similar(query_embedding: list[float], limit: int = 3, batch_size: int = 1000,
+                aggregation: str = 'max', exclude_prompt_text: str | None = None) -> list[tuple[int, float]]:
+    # Эмбеддинги в индексе единичной длины, нормализуем только запрос
+    query_emb = np.array(query_embedding, dtype=np.float32)
+    query_norm = query_emb / np.linalg.norm(query_emb)
+    
+    try:
+        matrix, function_ids, prompt_ids, group_starts, group_ids, ann = _EMBEDDING_INDEX.arrays(batch_size)
+        excluded_prompt_ids = _prompt_ids_by_text(exclude_prompt_text) if exclude_prompt_text is not None else []
     
     except Exception as e:
         raise Exception(f"Ошибка поиска похожих эмбеддингов: {e}")
     
-    if not top_results:
+    if limit <= 0 or matrix.shape[0] == 0 or matrix.shape[1] != query_norm.shape[0]:
+        return []
+    
+    # Приближенный поиск: только строки ближайших кластеров (по возрастанию, группы функций сохраняются)
+    rows = ann.candidates(query_norm) if ann is not None else None
+
+    # Без исключенных промптов
+    if excluded_prompt_ids:
+        keep = ~np.isin(prompt_ids, excluded_prompt_ids)
+        rows = np.flatnonzero(keep) if rows is None else rows[keep[rows]]
+
+    # Скалярное произведение нормализованных векторов = косинус угла
+    if rows is None:
+        similarities = matrix @ query_norm
+    else:
+        similarities = matrix[rows] @ query_norm
+        group_starts, group_ids = _function_groups(function_ids[rows])
+
+    if similarities.shape[0] == 0:
         return []
+
+    # Близость функций по группам ее строк, каждая функция - один раз
+    if aggregation == 'mean':
+        counts = np.diff(np.r_[group_starts, similarities.shape[0]])
+        scores = np.add.reduceat(similarities, group_starts) / counts
+    else:
+        scores = np.maximum.reduceat(similarities, group_starts)
+
+    # Топ-N без полной сортировки, затем сортировка только отобранных
+    if limit < scores.shape[0]:
+        top_idx = np.argpartition(-scores, limit - 1)[:limit]
+    else:
+        top_idx = np.arange(scores.shape[0])
+    top_idx = top_idx[np.argsort(-scores[top_idx], kind='stable')]
     
     # Возвращаем отсортированные результаты (id, similarity)
-    return [(emb_id, float(sim)) for sim, emb_id in sorted(top_results, reverse=True)]
+    return [(int(group_ids[i]), float(scores[i])) for i in top_idx]
 
-# Сохранение функции
+# Сохранение функции пользователем (синхронизация со списком программ ее больше не изменяет)
 def save_function(function_id: int = None, name: str = None, type_id: int = None, 
                 description: str = None, command: str = None) -> int:
     try:
@@ -452,27 +1049,232 @@ def save_function(function_id: int = None, name: str = None, type_id: int = None
             if function_id:  # Обновление существующей
                 cursor.execute('''
                     UPDATE functions 
-                    SET name = ?, type_id = ?, description = ?, command = ?
+                    SET name = ?, type_id = ?, description = ?, command = ?, source = ?, app_hash = NULL
                     WHERE id = ?
-                ''', (name, type_id, description, command, function_id))
+                ''', (name, type_id, description, command, FUNCTION_SOURCE_USER, function_id))
                 connection.commit()
 
                 result = function_id
 
             else:  # Создание новой
                 cursor.execute('''
-                    INSERT INTO functions (name, type_id, description, command)
-                    VALUES (?, ?, ?, ?)
-                ''', (name, type_id, description, command))
+                    INSERT INTO functions (name, type_id, description, command, source)
+                    VALUES (?, ?, ?, ?, ?)
+                ''', (name, type_id, description, command, FUNCTION_SOURCE_USER))
                 connection.commit()
 
                 result =  cursor.lastrowid
+
+        # Индекс эмбеддингов загрузится заново
+        _EMBEDDING_INDEX.invalidate()
             
     except Exception as e:
         raise Exception(f"Ошибка сохранения функции: {e}")
 
     return result
 
+# Сохранение списка функций одной транзакцией, функция ищется по команде запуска
+# functions: [(name, type_id, description, command), ...]; результат - id функций (None - ошибка записи)
+# app_hashes - хэши описаний программ ОС, из которых получены функции (функции отмечаются как импортированные)
+def save_functions(functions: list[tuple[str, int, str, str]], app_hashes: list[str] | None = None) -> list[int | None]:
+    result = []
+
+    try:
+        with _functions_db_connection() as connection:
+            cursor = _functions_db_cursor(connection)
+
+            for i, (name, type_id, description, command) in enumerate(functions):
+                try:
+                    cursor.execute('SELECT id, source, app_hash FROM functions WHERE command = ?', (command,))
+                    row = cursor.fetchone()
+
+                    # Источник и хэш программы: прежние, если список не из программ ОС
+                    if app_hashes is not None:
+                        source, app_hash = FUNCTION_SOURCE_OS, app_hashes[i]
+                    else:
+                        source, app_hash = row[1:] if row else (None, None)
+
+                    if row:  # Обновление существующей
+                        cursor.execute('''
+                            UPDATE functions 
+                            SET name = ?, type_id = ?, description = ?, source = ?, app_hash = ?
+                            WHERE id = ?
+                        ''', (name, type_id, description, source, app_hash, row[0]))
+                        result.append(row[0])
+
+                    else:  # Создание новой
+                        cursor.execute('''
+                            INSERT INTO functions (name, type_id, description, command, source, app_hash)
+                            VALUES (?, ?, ?, ?, ?, ?)
+                        ''', (name, type_id, description, command, source, app_hash))
+                        result.append(cursor.lastrowid)
+
+                # Например, неуникальное имя - пропускаем только эту функцию
+                except sqlite3.IntegrityError:
+                    result.append(None)
+
+            connection.commit()
+
+        # Индекс эмбеддингов загрузится заново
+        _EMBEDDING_INDEX.invalidate()
+
+    except Exception as e:
+        raise Exception(f"Ошибка сохранения списка функций: {e}")
+
+    return result
+
+# Источники функций для синхронизации со списком программ: {команда: (id, источник, хэш программы)}
+def function_sources() -> dict[str, tuple[int, str | None, str | None]]:
+    try:
+        with _functions_db_connection() as connection:
+            cursor = _functions_db_cursor(connection)
+            cursor.execute('SELECT id, command, source, app_hash FROM functions')
+
+            return {command: (function_id, source, app_hash) for function_id, command, source, app_hash in cursor.fetchall()}
+
+    except Exception as e:
+        raise Exception(f'Ошибка получения источников функций: {e}')
+
+# Отметка функций как импортированных из программ ОС: [(id, хэш программы), ...]
+def mark_functions_imported(functions: list[tuple[int, str]]):
+    try:
+        with _functions_db_connection() as connection:
+            cursor = _functions_db_cursor(connection)
+            cursor.executemany(
+                'UPDATE functions SET source = ?, app_hash = ? WHERE id = ?',
+                [(FUNCTION_SOURCE_OS, app_hash, function_id) for function_id, app_hash in functions]
+            )
+            connection.commit()
+
+    except Exception as e:
+        raise Exception(f'Ошибка отметки импортированных функций: {e}')
+
+# Программы, пропускаемые синхронизацией: {команда: (причина, хэш программы, время в секундах)}
+def skipped_apps() -> dict[str, tuple[str, str | None, int]]:
+    try:
+        with _functions_db_connection() as connection:
+            cursor = _functions_db_cursor(connection)
+            cursor.execute('SELECT command, reason, app_hash, timestamp FROM skipped_apps')
+
+            return {command: (reason, app_hash, timestamp) for command, reason, app_hash, timestamp in cursor.fetchall()}
+
+    except Exception as e:
+        raise Exception(f'Ошибка получения пропускаемых программ: {e}')
+
+# Отметка программ, описание которых не получено: [(команда, хэш программы), ...]
+# С программ из described_commands (описание получено) отметка снимается
+def mark_apps_failed(failed: list[tuple[str, str]], described_commands: list[str] | None = None):
+    try:
+        with _functions_db_connection() as connection:
+            cursor = _functions_db_cursor(connection)
+            cursor.executemany('''
+                INSERT OR REPLACE INTO skipped_apps (command, reason, app_hash, timestamp)
+                VALUES (?, ?, ?, CAST(strftime('%s', 'now') AS INTEGER))
+            ''', [(command, SKIPPED_APP_FAILED, app_hash) for command, app_hash in failed])
+            cursor.executemany(
+                'DELETE FROM skipped_apps WHERE command = ? AND reason = ?',
+                [(command, SKIPPED_APP_FAILED) for command in described_commands or []]
+            )
+            connection.commit()
+
+    except Exception as e:
+        raise Exception(f'Ошибка отметки программ без описания: {e}')
+
+# Есть ли в базе данных полнотекстовый индекс
+def _fulltext_available(cursor) -> bool:
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'functions_fts'")
+    return cursor.fetchone() is not None
+
+# Запрос FTS5 из текста пользователя: слова через OR (или AND), с поиском по началу слова
+# Окончания длинных слов отбрасываются - грубая замена морфологии ("блокнота" найдет "Блокнот")
+def _fulltext_query(text: str, operator: str = 'OR') -> str | None:
+    terms = []
+    for word in re.findall(r'\w+', text.lower()):
+        if len(word) < 2:
+            continue
+        if len(word) >= 5:
+            word = word[:max(4, len(word) - 2)]
+        terms.append(f'"{word}"*')
+
+    return f' {operator} '.join(terms) if terms else None
+
+# Полнотекстовый поиск функций по имени, описанию, команде и промптам: [(id функции, оценка BM25)]
+# Чем больше оценка, тем лучше совпадение; без FTS5 - пустой список
+def lexical_search(query: str, limit: int = 10) -> list[tuple[int, float]]:
+    match = _fulltext_query(query)
+    if match is None or limit <= 0:
+        return []
+
+    try:
+        with _functions_db_connection() as connection:
+            cursor = _functions_db_cursor(connection)
+
+            if not _fulltext_available(cursor):
+                return []
+
+            # Совпадение в имени весит больше, чем в команде и описании
+            cursor.execute('''
+                SELECT rowid, bm25(functions_fts, 10.0, 1.0, 2.0) AS score
+                FROM functions_fts
+                WHERE functions_fts MATCH ?
+                ORDER BY score
+                LIMIT ?
+            ''', (match, limit))
+            rows = cursor.fetchall()
+
+            cursor.execute('''
+                SELECT p.function_id, bm25(prompts_fts) AS score
+                FROM prompts_fts
+                JOIN prompts p ON p.id = prompts_fts.rowid
+                WHERE prompts_fts MATCH ?
+                ORDER BY score
+                LIMIT ?
+            ''', (match, limit))
+            rows += cursor.fetchall()
+
+    except Exception as e:
+        raise Exception(f"Ошибка полнотекстового поиска: {e}")
+
+    # Лучшая оценка функции (BM25 в SQLite тем меньше, чем лучше совпадение)
+    scores = {}
+    for function_id, score in rows:
+        scores[function_id] = max(scores.get(function_id, float('-inf')), -score)
+
+    return sorted(scores.items(), key=lambda item: -item[1])[:limit]
+
+# Функция с точно таким именем, без учета регистра (None - не найдена)
+def function_id_by_name(name: str) -> int | None:
+    name = name.strip()
+    if not name:
+        return None
+
+    try:
+        with _functions_db_connection() as connection:
+            cursor = _functions_db_cursor(connection)
+
+            # Кандидаты из полнотекстового индекса (все слова в имени), без FTS5 - сравнение в SQLite
+            if _fulltext_available(cursor):
+                match = ' '.join(f'"{word}"' for word in re.findall(r'\w+', name))
+                if not match:
+                    return None
+                cursor.execute('''
+                    SELECT rowid, name FROM functions_fts WHERE functions_fts MATCH ? LIMIT 20
+                ''', (f'name : ({match})',))
+            else:
+                cursor.execute('SELECT id, name FROM functions WHERE name = ? COLLATE NOCASE', (name,))
+            rows = cursor.fetchall()
+
+    except Exception as e:
+        raise Exception(f"Ошибка поиска функции по имени: {e}")
+
+    # COLLATE NOCASE и FTS5 не сравнивают кириллицу с учетом регистра точно - проверяем сами
+    folded_name = name.casefold()
+    for function_id, function_name in rows:
+        if function_name.casefold() == folded_name:
+            return function_id
+
+    return None
+
 # Сохранение промпта
 def save_prompt(prompt_id: int = None, function_id: int = None, text: str = None) -> int:
     try:
@@ -491,8 +1293,64 @@ def save_prompt(prompt_id: int = None, function_id: int = None, text: str = None
                 connection.commit()
 
                 result = cursor.lastrowid
+
+        # Индекс эмбеддингов загрузится заново
+        _EMBEDDING_INDEX.invalidate()
             
     except Exception as e:
         raise Exception(f"Ошибка сохранения промпта: {e}")
 
     return result
+
+# Замер обращений к базе данных функций: python funcdb.py [функций] [обращений]
+# Постоянное соединение потока сравнивается с прежней схемой: новое соединение и проверка схемы при каждом обращении
+if __name__ == '__main__':
+    import shutil
+    import sys
+    import tempfile
+    import time
+
+    from utilities import set_main_folder
+
+    function_count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    call_count = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+
+    # Временная база данных функций с промптами
+    temp_folder = tempfile.mkdtemp()
+    try:
+        with open(os.path.join(temp_folder, 'config.ini'), 'w', encoding='utf-8') as f:
+            f.write('[FUNCTIONS_DB]\ndb_name = functions.db\n')
+        set_main_folder(temp_folder)
+        open(functions_db_path(), 'wb').close()
+
+        type_id = function_type_id('Launch application')
+        function_ids = save_functions([
+            (f'Программа {i}', type_id, f'Описание программы {i}', f'C:\\Programs\\app{i}.exe')
+            for i in range(function_count)
+        ])
+        prompt_ids = [save_prompt(function_id=function_id, text=f'Запрос {function_id}') for function_id in function_ids[:100]]
+
+        def measure(operation, reconnect: bool) -> float:
+            start_time = time.perf_counter()
+            for i in range(call_count):
+                # Прежняя схема: соединение и инициализация схемы на каждое обращение
+                if reconnect:
+                    close_functions_db_connections()
+                    _DB_INITIALIZED.clear()
+                operation(i)
+            return 1e6 * (time.perf_counter() - start_time) / call_count
+
+        operations = {
+            'prompt()': lambda i: prompt(prompt_ids[i % len(prompt_ids)]),
+            'functions_list(10 id)': lambda i: functions_list(function_ids[i % 90:i % 90 + 10]),
+        }
+
+        print(f'Функций {function_count}, обращений {call_count}')
+        for title, operation in operations.items():
+            reconnect_us = measure(operation, True)
+            reuse_us = measure(operation, False)
+            print(f'{title:22s}  соединение на обращение {reconnect_us:.0f} мкс, соединение потока {reuse_us:.0f} мкс')
+
+    finally:
+        close_functions_db_connections()
+        shutil.rmtree(temp_folder, ignore_errors=True)
@@ -3,12 +3,17 @@ import sqlite3
 import tkinter as tk
 from tkinter import ttk, messagebox
 
-from funcdb import functions_list, function_types, function_details, delete_function, delete_prompt, save_function, save_prompt, prompt
+from bisect import bisect_left
+
+from funcdb import functions_count, functions_list, functions_page, function_matches_filter, function_types, function_details, delete_function, delete_prompt, save_function, save_prompt, prompt
 from utilities import main_logger, main_folder
 
 # Редактор функций
+# Таблица заполняется страницами при прокрутке, после изменений обновляется только измененная строка
 class FunctionEditorWindow:
     _instance = None  # Синглтон
+    _PAGE_SIZE = 200 # Строк на страницу
+    _FILTER_DELAY_MS = 300 # Задержка отбора после ввода текста
 
     def __new__(cls):
         # Новыqе экземпляр только один раз = Синглтон
@@ -22,6 +27,10 @@ class FunctionEditorWindow:
         if not hasattr(self, '_initialized'):
             self._logger = main_logger()
             self._parent_root = None
+            self._loaded_names = [] # Имена загруженных функций по возрастанию
+            self._row_names = {} # id загруженной функции -> имя
+            self._has_more = False # Есть незагруженные страницы
+            self._filter_job = None # Отложенный отбор
             self._create_window()
             self._create_ui()
             self._load_functions()
@@ -56,13 +65,19 @@ class FunctionEditorWindow:
         main_frame.columnconfigure(0, weight=1)
         main_frame.rowconfigure(1, weight=1)
         
-        # Кнопки управления (row 0)
+        # Кнопки управления и отбор (row 0)
         buttons_frame = ttk.Frame(main_frame)
         buttons_frame.grid(row=0, column=0, sticky=(tk.W, tk.E), pady=(0, 10))
-        buttons_frame.columnconfigure(1, weight=1)
+        buttons_frame.columnconfigure(3, weight=1)
         
         ttk.Button(buttons_frame, text="Добавить функцию", command=self._add_function).grid(row=0, column=0, sticky=tk.W, padx=(0, 10))
-        ttk.Button(buttons_frame, text="Удалить функцию", command=self._delete_function).grid(row=0, column=1, sticky=tk.W)
+        ttk.Button(buttons_frame, text="Удалить функцию", command=self._delete_function).grid(row=0, column=1, sticky=tk.W, padx=(0, 10))
+
+        # Отбор по тексту в базе данных, с задержкой после ввода
+        ttk.Label(buttons_frame, text="Отбор:").grid(row=0, column=2, sticky=tk.E, padx=(0, 5))
+        self.filter_var = tk.StringVar()
+        self.filter_var.trace_add('write', self._on_filter_changed)
+        ttk.Entry(buttons_frame, textvariable=self.filter_var).grid(row=0, column=3, sticky=(tk.W, tk.E))
         
         # Таблица функций с правильными скроллбарами (row 1-2)
         table_frame = ttk.Frame(main_frame)
@@ -89,10 +104,10 @@ class FunctionEditorWindow:
         
         self.functions_tree.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
         
-        # Скроллбары в углах
-        v_scrollbar = ttk.Scrollbar(table_frame, orient=tk.VERTICAL, command=self.functions_tree.yview)
-        v_scrollbar.grid(row=0, column=1, sticky=(tk.N, tk.S))
-        self.functions_tree.configure(yscrollcommand=v_scrollbar.set)
+        # Скроллбары в углах, прокрутка к концу загружает следующую страницу
+        self._v_scrollbar = ttk.Scrollbar(table_frame, orient=tk.VERTICAL, command=self.functions_tree.yview)
+        self._v_scrollbar.grid(row=0, column=1, sticky=(tk.N, tk.S))
+        self.functions_tree.configure(yscrollcommand=self._on_tree_scroll)
         
         h_scrollbar = ttk.Scrollbar(table_frame, orient=tk.HORIZONTAL, command=self.functions_tree.xview)
         h_scrollbar.grid(row=1, column=0, sticky=(tk.W, tk.E), columnspan=2)
@@ -109,32 +124,101 @@ class FunctionEditorWindow:
         # Двойной клик
         self.functions_tree.bind('<Double-1>', self._edit_function)
     
-    # Загрузка функций
+    # Загрузка функций: таблица очищается и заполняется первой страницей
     def _load_functions(self):
+        self.functions_tree.delete(*self.functions_tree.get_children())
+        self._loaded_names = []
+        self._row_names = {}
+        self._has_more = True
+        self._load_next_page()
+
+    # Загрузка следующей страницы функций
+    def _load_next_page(self):
         try:
-            # Очищаем таблицу
-            for item in self.functions_tree.get_children():
-                self.functions_tree.delete(item)
-            
-            # Получаем функции через функцию из funcdb.py
-            functions = functions_list()
+            filter_text = self.filter_var.get()
+            after_name = self._loaded_names[-1] if self._loaded_names else None
+            functions = functions_page(after_name, self._PAGE_SIZE, filter_text)
             
             for func in functions:
-                # func содержит: (id, name, description, type_name, command)
-                self.functions_tree.insert('', tk.END, values=func)
-            
-            self.status_var.set(f"Загружено функций: {len(functions)}")
+                # func содержит: (id, name, description, type_name, command), iid строки - id функции
+                self.functions_tree.insert('', tk.END, iid=str(func[0]), values=func)
+                self._loaded_names.append(func[1])
+                self._row_names[func[0]] = func[1]
+
+            self._has_more = len(functions) == self._PAGE_SIZE
+            self._update_status(filter_text)
             
         except Exception as e:
+            self._has_more = False
             self._logger.error(f"Ошибка загрузки функций: {e}")
             self.status_var.set(f"Ошибка: {e}")
 
+    # Строка статуса: загружено и всего
+    def _update_status(self, filter_text: str = None):
+        total = functions_count(filter_text) if self._has_more else len(self._loaded_names)
+        self.status_var.set(f"Загружено функций: {len(self._loaded_names)} из {total}")
+
+    # Прокрутка таблицы: у конца загруженных строк подгружаем следующую страницу
+    def _on_tree_scroll(self, first, last):
+        self._v_scrollbar.set(first, last)
+        if self._has_more and float(last) > 0.9:
+            self._has_more = False # Не загружаем повторно до окончания загрузки
+            self.root.after_idle(self._load_next_page)
+
+    # Изменение текста отбора: загрузка после паузы ввода
+    def _on_filter_changed(self, *args):
+        if self._filter_job is not None:
+            self.root.after_cancel(self._filter_job)
+        self._filter_job = self.root.after(self._FILTER_DELAY_MS, self._apply_filter)
+
+    # Применение отбора
+    def _apply_filter(self):
+        self._filter_job = None
+        self._load_functions()
+
+    # Удаление строки функции из таблицы
+    def _remove_row(self, function_id: int):
+        name = self._row_names.pop(function_id, None)
+        if name is None:
+            return
+
+        index = bisect_left(self._loaded_names, name)
+        if index < len(self._loaded_names) and self._loaded_names[index] == name:
+            del self._loaded_names[index]
+        self.functions_tree.delete(str(function_id))
+
+    # Обновление строки функции после изменения: только эта строка, на месте по порядку имен
+    def _patch_row(self, function_id: int):
+        try:
+            self._remove_row(function_id)
+
+            # Функция удалена или не проходит отбор
+            rows = functions_list([function_id])
+            if not rows or not function_matches_filter(function_id, self.filter_var.get()):
+                return
+            func = rows[0]
+
+            # Строка за пределами загруженных страниц появится при прокрутке
+            name = func[1]
+            index = bisect_left(self._loaded_names, name)
+            if index >= len(self._loaded_names) and self._has_more:
+                return
+
+            self.functions_tree.insert('', index, iid=str(function_id), values=func)
+            self._loaded_names.insert(index, name)
+            self._row_names[function_id] = name
+            self._update_status(self.filter_var.get())
+
+        except Exception as e:
+            self._logger.error(f"Ошибка обновления функции: {e}")
+            self.status_var.set(f"Ошибка: {e}")
+
     # Добавление функции
     def _add_function(self):
         # Открываем диалог
         dialog = FunctionCard(self.root, None)
         if dialog.result:
-            self._load_functions()
+            self._patch_row(dialog.function_id)
     
     # Изменение функции
     def _edit_function(self, event):
@@ -143,14 +227,13 @@ class FunctionEditorWindow:
         if not selection:
             return
         
-        # Получаем поле id
-        item = self.functions_tree.item(selection[0])
-        func_id = item['values'][0]
+        # Идентификатор строки - id функции
+        func_id = int(selection[0])
         
         # Открываем диалог
         dialog = FunctionCard(self.root, func_id)
         if dialog.result:
-            self._load_functions()
+            self._patch_row(func_id)
     
     # Удаление функции
     def _delete_function(self):
@@ -159,16 +242,16 @@ class FunctionEditorWindow:
         if not selection:
             return
 
-        # Получаем поле id
-        item = self.functions_tree.item(selection[0])
-        func_id = item['values'][0]
+        # Идентификатор строки - id функции
+        func_id = int(selection[0])
         
         # Спрашиваем подтверждение
         if tk.messagebox.askyesno("Подтверждение", f"Удалить функцию ID {func_id}?"):
             try:
                 # Удаляем функцию
                 delete_function(func_id)
-                self._load_functions()
+                self._remove_row(func_id)
+                self._update_status(self.filter_var.get())
 
                 self.status_var.set("Функция удалена")
                 
@@ -1,7 +1,10 @@
 from collections import deque
 import json
 
+import atexit
 import os
+import threading
+import time
 
 from gigachat import GigaChat
 import gigachat.context
@@ -9,6 +12,7 @@ from gigachat.exceptions import AuthenticationError, ResponseError
 from gigachat.models import Chat, Messages, MessagesRole
 
 from agents import AIAgentMessage, BaseAIFunctions, BaseAIAgent
+from llmcache import llm_response_cache
 from utilities import config_value, main_folder
 
 # Ключевые настройки GigaChat
@@ -37,34 +41,57 @@ def default_model_name() -> str:
 
     return model_name
 
+# Общие для процесса клиенты GigaChat по ключу авторизации
+# Токен доступа SDK запрашивает при первом запросе и сам получает новый, когда сервер отвечает 401
+_GIGACHAT_CLIENTS: dict[str, GigaChat] = {}
+_GIGACHAT_CLIENTS_LOCK = threading.Lock()
+
+# Клиент GigaChat: общий пул соединений HTTP и кэшированный токен доступа
+def _gigachat_client(authorization_key: str) -> GigaChat:
+    with _GIGACHAT_CLIENTS_LOCK:
+        giga = _GIGACHAT_CLIENTS.get(authorization_key)
+        if giga is None:
+            giga = _GIGACHAT_CLIENTS[authorization_key] = GigaChat(
+                credentials=authorization_key,
+                scope='GIGACHAT_API_PERS',
+                verify_ssl_certs=False
+            )
+
+        return giga
+
+# Закрытие клиентов GigaChat
+def close_gigachat_clients():
+    with _GIGACHAT_CLIENTS_LOCK:
+        for giga in _GIGACHAT_CLIENTS.values():
+            giga.close()
+        _GIGACHAT_CLIENTS.clear()
+
+atexit.register(close_gigachat_clients)
+
 # Ответ на запрос
 def response_to_prompt(authorization_key: str, headers: dict, model_name: str, message_list: list, function_list: list | None = None):
-    # Экземпляр GigaChat
-    with GigaChat(
-        credentials=authorization_key,
-        scope='GIGACHAT_API_PERS',
-        verify_ssl_certs=False
-    ) as giga:
-        gigachat.context.session_id_cvar.set(headers.get("X-Session-ID"))
-
-        # Новое сообщение в чат
-        chat = Chat(
-            messages=message_list,
-            model=model_name,
-            functions=function_list
-        )
+    # Общий экземпляр GigaChat
+    giga = _gigachat_client(authorization_key)
+    gigachat.context.session_id_cvar.set(headers.get("X-Session-ID"))
+
+    # Новое сообщение в чат
+    chat = Chat(
+        messages=message_list,
+        model=model_name,
+        functions=function_list
+    )
 
-        # Получение ответа от чата
-        try:
-            response = giga.chat(chat)
+    # Получение ответа от чата
+    try:
+        response = giga.chat(chat)
 
-        except AuthenticationError as e:
-            raise Exception(f'Ошибка авторизации в GigaChat: {e}')
+    except AuthenticationError as e:
+        raise Exception(f'Ошибка авторизации в GigaChat: {e}')
 
-        except ResponseError as e:
-            raise Exception(f'Ошибка получения ответа GigaChat: {e}')
+    except ResponseError as e:
+        raise Exception(f'Ошибка получения ответа GigaChat: {e}')
 
-        return response
+    return response
 
 def new_app_description(app_info: dict) -> str:
     system_prompt = Messages(
@@ -93,14 +120,86 @@ def new_app_description(app_info: dict) -> str:
     Assistant: {"description": null}"""
     )
 
+    # Повторные запросы по той же программе берем из кэша без обращения к GigaChat
+    model_name = default_model_name()
+    cache = llm_response_cache()
+    cache_key = cache.key(model_name, system_prompt.content, app_info)
+
+    result = cache.get(cache_key)
+    if result is not None:
+        return result
+
     user_prompt = Messages(
         role=MessagesRole.USER,
         content=json.dumps(app_info, indent=1, ensure_ascii=False)
     )
 
     authorization_key, headers = _gigachat_key_settings()
-    response = response_to_prompt(authorization_key, headers, default_model_name(), [system_prompt, user_prompt])
-    return response.choices[0].message.content.strip()
+    response = response_to_prompt(authorization_key, headers, model_name, [system_prompt, user_prompt])
+    result = response.choices[0].message.content.strip()
+
+    # Кэшируем только ответ в ожидаемом формате
+    try:
+        if 'description' in json.loads(result):
+            cache.put(cache_key, result)
+
+    except (json.JSONDecodeError, TypeError):
+        pass
+
+    return result
+
+# Описание нескольких программ одним запросом: список описаний в порядке app_infos (None - неизвестна)
+def new_apps_descriptions(app_infos: list[dict]) -> list[str | None]:
+    system_prompt = Messages(
+        role=MessagesRole.SYSTEM,
+        content="""Ты — специалист по компьютерным программам.
+
+### Твоя задача:
+Создавать описание известных тебе программ из списка.
+
+### Требования:
+- Достоверность — создавай описание только извесных тебе программ.
+- Краткость — описание должно быть коротким.
+- Точность — описание должно быть точным.
+- Порядок — ответ содержит по одному элементу для каждой программы в порядке списка.
+- Формат ответа: JSON-массив, для известных программ {"description": "Текст описания"}, для неизвестных {"description": null}
+        
+### Пример корректного запроса и ответа:
+User: [{"name": "Блокнот", "command": "notepad.exe", "description": null}, {"name": "Хероборатор", "command": "C:\\Heroborator.exe", "description": "Конструктор херобор"}]
+Assistant: [{"description": "Простой редактор текста"}, {"description": null}]"""
+    )
+
+    # Описания из кэша, в GigaChat запрашиваем только остальные программы
+    model_name = default_model_name()
+    cache = llm_response_cache()
+    cache_keys = [cache.key(model_name, system_prompt.content, app_info) for app_info in app_infos]
+
+    descriptions = {}
+    for i, cache_key in enumerate(cache_keys):
+        cached = cache.get(cache_key)
+        if cached is not None:
+            descriptions[i] = json.loads(cached)['description']
+
+    missing = [i for i in range(len(app_infos)) if i not in descriptions]
+    if missing:
+        user_prompt = Messages(
+            role=MessagesRole.USER,
+            content=json.dumps([app_infos[i] for i in missing], indent=1, ensure_ascii=False)
+        )
+
+        authorization_key, headers = _gigachat_key_settings()
+        response = response_to_prompt(authorization_key, headers, model_name, [system_prompt, user_prompt])
+
+        # Ответ должен содержать описание для каждой программы
+        result = json.loads(response.choices[0].message.content.strip())
+        if not isinstance(result, list) or len(result) != len(missing):
+            raise Exception('Количество описаний не совпадает с количеством программ')
+
+        for i, item in zip(missing, result):
+            descriptions[i] = item.get('description') if isinstance(item, dict) else None
+            cache.put(cache_keys[i], json.dumps({'description': descriptions[i]}, ensure_ascii=False))
+
+    return [descriptions[i] for i in range(len(app_infos))]
 
 # История сообщений GigaChat
 class GigaChatHistory():
@@ -118,28 +217,46 @@ class GigaChatHistory():
         )
         self._messages = deque([message])
 
+        # Размеры сообщений и их сумма, обновляются при добавлении и удалении
+        self._message_sizes = deque([self._message_size(message)])
+        self._context_size = self._message_sizes[0]
+
     # Количество сообщений в истории для функции len()
     def __len__(self) -> int:
         return len(self._messages)
 
+    # Размер сообщения в единицах max_context_length (символы)
+    @staticmethod
+    def _message_size(message: Messages) -> int:
+        return len(message.content or '')
+
     # Размер контекста как сумма длины всех сообщений
     def _context_length(self) -> int:
-        return sum(len(message.content) for message in self._messages)
+        return self._context_size
+
+    # Удаление самого старого сообщения (кроме системного промпта)
+    def _remove_oldest_message(self):
+        del self._messages[1]
+        self._context_size -= self._message_sizes[1]
+        del self._message_sizes[1]
 
     # Ограничение максимального размера контекста
     def _enforce_context_limit(self):
         # Удаление самого старого сообщение (кроме системного промта)
         while len(self) > 2 and self._context_length() > self._max_context_length:
-            del self._messages[1]
+            self._remove_oldest_message()
 
         # Контроль: втрое сообщение должно быть от пользователя
         if len(self) > 2 and self._messages[1].role != MessagesRole.USER:
-            del self._messages[1]
+            self._remove_oldest_message()
 
     # Добавление любого сообщения GigaChat
     def add_message(self, message: Messages):
         # Добавление сообщения
+        size = self._message_size(message)
         self._messages.append(message)
+        self._message_sizes.append(size)
+        self._context_size += size
         # Контроль размера контекста
         self._enforce_context_limit()
 
@@ -182,6 +299,7 @@ class GigaChatHistory():
         return list(self._messages)
 
 # Базовый класс GigaChat AI-агента
+# Асинхронный ответ - реализация BaseAIAgent по умолчанию: синхронный запрос к GigaChat в пуле потоков
 class BaseGigaChatAIAgent(BaseAIAgent):
     def __init__(self, system_prompt: str, model: str, functions: list):
         # Ключевые настройки
@@ -249,3 +367,128 @@ class BaseGigaChatAIAgent(BaseAIAgent):
     def clear_context(self):
         # Новая история чата с GigaChat
         self._chat_history = GigaChatHistory(self._system_prompt)
+
+# Проверка на локальной заглушке API: одно соединение и один запрос токена на сессию
+def _check_session(request_count: int):
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    # Заглушка API GigaChat: HTTP/1.1 с keep-alive, после половины запросов токен "истекает" (ответ 401)
+    stats = {'connections': 0, 'chat_connections': set(), 'auth': 0, 'chat': 0, 'token': 'token-1'}
+    stats_lock = threading.Lock()
+
+    class StubHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        disable_nagle_algorithm = True
+
+        def setup(self):
+            super().setup()
+            with stats_lock:
+                stats['connections'] += 1
+
+        def log_message(self, format, *args):
+            pass
+
+        def _reply(self, status: int, body: dict):
+            data = json.dumps(body).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            with stats_lock:
+                if self.path == '/oauth':
+                    stats['auth'] += 1
+                    stats['token'] = f"token-{stats['auth']}"
+                    body = {'access_token': stats['token'], 'expires_at': int((time.time() + 1800) * 1000)}
+                    return self._reply(200, body)
+
+                stats['chat_connections'].add(id(self))
+                if self.headers.get('Authorization') != f"Bearer {stats['token']}":
+                    return self._reply(401, {'status': 401, 'message': 'Unauthorized'})
+
+                stats['chat'] += 1
+                if stats['chat'] == request_count // 2:
+                    stats['token'] = 'expired'
+
+            self._reply(200, {
+                'choices': [{'message': {'role': 'assistant', 'content': 'ok'}, 'index': 0, 'finish_reason': 'stop'}],
+                'created': int(time.time()),
+                'model': 'GigaChat',
+                'usage': {'prompt_tokens': 1, 'completion_tokens': 1, 'total_tokens': 2},
+                'object': 'chat.completion'
+            })
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    # Адреса API берутся SDK из переменных окружения
+    stub_url = f'http://127.0.0.1:{server.server_port}'
+    os.environ['GIGACHAT_BASE_URL'] = stub_url
+    os.environ['GIGACHAT_AUTH_URL'] = f'{stub_url}/oauth'
+
+    try:
+        message_list = [Messages(role=MessagesRole.USER, content='Привет')]
+        start_time = time.perf_counter()
+        for _ in range(request_count):
+            response_to_prompt('c3R1YjprZXk=', {'X-Session-ID': 'stub-session'}, 'GigaChat', message_list)
+        elapsed = time.perf_counter() - start_time
+
+        print(f"Запросов {stats['chat']} за {1000 * elapsed:.0f} мс ({1000 * elapsed / request_count:.1f} мс на запрос)")
+        print(f"Соединений всего {stats['connections']}, из них с запросами к чату {len(stats['chat_connections'])}")
+        print(f"Запросов токена {stats['auth']} (повторный - после ответа 401 на истекший токен)")
+
+    finally:
+        close_gigachat_clients()
+        server.shutdown()
+
+# Замер учета размера контекста: пересчет суммы по всем сообщениям против накопленной суммы
+def _benchmark_context(message_count: int, message_length: int = 500):
+    import shutil
+    import tempfile
+
+    from utilities import set_main_folder
+
+    # Прежний учет: сумма длины всех сообщений при каждой проверке лимита
+    class RecountHistory(GigaChatHistory):
+        def _context_length(self) -> int:
+            return sum(len(message.content or '') for message in self._messages)
+
+    temp_folder = tempfile.mkdtemp()
+    try:
+        with open(os.path.join(temp_folder, 'config.ini'), 'w', encoding='utf-8') as f:
+            f.write('[GIGACHAT]\nmax_context_length = 64000\n')
+        set_main_folder(temp_folder)
+
+        contents = [str(i % 10) * (message_length + i % 100) for i in range(message_count)]
+        results = {}
+        for title, history_class in (('Пересчет', RecountHistory), ('Накопленная сумма', GigaChatHistory)):
+            history = history_class('Системный промпт')
+            start_time = time.perf_counter()
+            for i, content in enumerate(contents):
+                if i % 2:
+                    history.add_assistant_content(content)
+                else:
+                    history.add_user_content(content)
+            elapsed = time.perf_counter() - start_time
+            results[title] = [message.content for message in history.messages()]
+            print(f'{title}: {1000 * elapsed:.1f} мс, {1e6 * elapsed / message_count:.1f} мкс на сообщение, в истории {len(history)}')
+
+        print(f"Истории совпадают: {len(set(map(tuple, results.values()))) == 1}")
+
+    finally:
+        shutil.rmtree(temp_folder, ignore_errors=True)
+
+# python gigagents.py session [запросов] - проверка соединений на заглушке API
+# python gigagents.py context [сообщений] - замер учета размера контекста
+if __name__ == '__main__':
+    import sys
+
+    mode = sys.argv[1] if len(sys.argv) > 1 else 'session'
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else None
+    if mode == 'context':
+        _benchmark_context(count or 10000)
+    else:
+        _check_session(count or 20)
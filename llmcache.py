@@ -0,0 +1,136 @@
+import os
+
+import hashlib
+import json
+import threading
+import time
+
+import sqlite3
+
+from utilities import config_float, config_str, main_folder, main_logger
+
+# Постоянный кэш ответов LLM с ограничением срока хранения и размера
+class LLMResponseCache:
+    def __init__(self, db_path: str, ttl_seconds: float, max_size_bytes: int):
+        self._logger = main_logger()
+        self._ttl_seconds = ttl_seconds
+        self._max_size_bytes = max_size_bytes
+
+        # Счетчики попаданий и промахов
+        self.hits = 0
+        self.misses = 0
+
+        # Одно соединение на процесс, доступ из потоков под блокировкой
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(db_path, timeout=30.0, check_same_thread=False)
+        self._connection.execute('PRAGMA journal_mode = WAL')
+        self._connection.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key VARCHAR(64) PRIMARY KEY,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )"""
+        )
+        self._connection.execute('CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at)')
+        self._connection.commit()
+
+        # Удаление устаревших записей
+        with self._lock:
+            self._evict()
+
+    # Ключ кэша: хэш имени модели, системного промпта и данных запроса
+    @staticmethod
+    def key(model_name: str, system_prompt: str, payload) -> str:
+        data = json.dumps([model_name, system_prompt, payload], ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+    # Ответ из кэша (None - нет или устарел)
+    def get(self, key: str) -> str | None:
+        now = time.time()
+
+        with self._lock:
+            row = self._connection.execute(
+                'SELECT value, created_at FROM responses WHERE key = ?', (key,)
+            ).fetchone()
+
+            if row is None or now - row[1] > self._ttl_seconds:
+                self.misses += 1
+                result = None
+
+            else:
+                self.hits += 1
+                self._connection.execute('UPDATE responses SET accessed_at = ? WHERE key = ?', (now, key))
+                self._connection.commit()
+                result = row[0]
+
+            hits, misses = self.hits, self.misses
+
+        # Логгирование на уровне отладки
+        self._logger.debug('Кэш ответов LLM: %s, попаданий %s, промахов %s', 'попадание' if result is not None else 'промах', hits, misses)
+
+        return result
+
+    # Запись ответа в кэш
+    def put(self, key: str, value: str):
+        now = time.time()
+
+        with self._lock:
+            self._connection.execute(
+                '''INSERT OR REPLACE INTO responses (key, value, size, created_at, accessed_at)
+                   VALUES (?, ?, ?, ?, ?)''',
+                (key, value, len(value.encode('utf-8')), now, now)
+            )
+            self._evict()
+
+    # Удаление устаревших записей и давно не использованных сверх ограничения размера
+    def _evict(self):
+        self._connection.execute('DELETE FROM responses WHERE created_at < ?', (time.time() - self._ttl_seconds,))
+
+        total_size = self._connection.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+        if total_size > self._max_size_bytes:
+            excess = total_size - self._max_size_bytes
+            cursor = self._connection.execute('SELECT key, size FROM responses ORDER BY accessed_at')
+
+            evicted = []
+            for key, size in cursor:
+                if excess <= 0:
+                    break
+                evicted.append((key,))
+                excess -= size
+
+            self._connection.executemany('DELETE FROM responses WHERE key = ?', evicted)
+
+        self._connection.commit()
+
+    # Запись счетчиков в лог
+    def log_stats(self):
+        with self._lock:
+            hits, misses = self.hits, self.misses
+
+        total = hits + misses
+        hit_rate = 100 * hits / total if total else 0
+        self._logger.info(f'Кэш ответов LLM: попаданий {hits}, промахов {misses} ({hit_rate:.0f}% попаданий)')
+
+# Экземпляр кэша ответов LLM
+_LLM_RESPONSE_CACHE = None
+_LLM_RESPONSE_CACHE_LOCK = threading.Lock()
+
+# Кэш ответов LLM
+def llm_response_cache() -> LLMResponseCache:
+    global _LLM_RESPONSE_CACHE
+
+    with _LLM_RESPONSE_CACHE_LOCK:
+        if _LLM_RESPONSE_CACHE is None:
+            file_name = config_str(None, 'LLM_CACHE', 'file_name', 'llm_cache.db')
+            ttl_days = config_float(None, 'LLM_CACHE', 'ttl_days', 90)
+            max_size_mb = config_float(None, 'LLM_CACHE', 'max_size_mb', 16)
+
+            _LLM_RESPONSE_CACHE = LLMResponseCache(
+                os.path.join(main_folder(), file_name),
+                ttl_days * 24 * 3600,
+                int(max_size_mb * 1024 * 1024)
+            )
+
+    return _LLM_RESPONSE_CACHE
@@ -0,0 +1,215 @@
+import os
+
+import re
+import struct
+
+# Разбор ярлыков Windows (.lnk) по спецификации MS-SHLLINK без COM и winshell
+
+# Размер и идентификатор класса заголовка ярлыка
+_HEADER_SIZE = 0x4C
+_LINK_CLSID = bytes.fromhex('0114020000000000c000000000000046')
+
+# Флаги ярлыка (LinkFlags)
+_HAS_LINK_TARGET_ID_LIST = 0x01
+_HAS_LINK_INFO = 0x02
+_HAS_NAME = 0x04
+_HAS_RELATIVE_PATH = 0x08
+_HAS_WORKING_DIR = 0x10
+_HAS_ARGUMENTS = 0x20
+_HAS_ICON_LOCATION = 0x40
+_IS_UNICODE = 0x80
+
+# Флаги информации о расположении (LinkInfoFlags)
+_VOLUME_ID_AND_LOCAL_BASE_PATH = 0x01
+_COMMON_NETWORK_RELATIVE_LINK_AND_PATH_SUFFIX = 0x02
+
+# Блок дополнительных данных с путем через переменные окружения
+_ENVIRONMENT_VARIABLE_BLOCK = 0xA0000001
+
+# Кодировка однобайтовых строк ярлыка (кодовая страница ANSI системы)
+_ANSI_ENCODING = 'mbcs' if os.name == 'nt' else 'cp1251'
+
+# Строка с нулевым окончанием: однобайтовая или UTF-16
+def _c_string(data: bytes, offset: int, unicode: bool = False) -> str:
+    if unicode:
+        end = offset
+        while end + 1 < len(data) and data[end:end + 2] != b'\x00\x00':
+            end += 2
+        return data[offset:end].decode('utf-16-le', errors='replace')
+
+    end = data.find(b'\x00', offset)
+    return data[offset:end if end >= 0 else len(data)].decode(_ANSI_ENCODING, errors='replace')
+
+# Путь из структуры LinkInfo: локальный путь или сетевой ресурс, к которому добавлен общий суффикс
+def _link_info_path(data: bytes) -> str:
+    size, header_size, flags = struct.unpack_from('<III', data, 0)
+    local_base_offset, network_offset, suffix_offset = struct.unpack_from('<III', data, 16)
+
+    # Начиная с заголовка 0x24 есть смещения Unicode-строк
+    unicode_offsets = struct.unpack_from('<II', data, 28) if header_size >= 0x24 else (0, 0)
+
+    suffix = _c_string(data, unicode_offsets[1], True) if unicode_offsets[1] else _c_string(data, suffix_offset)
+
+    if flags & _VOLUME_ID_AND_LOCAL_BASE_PATH:
+        if unicode_offsets[0]:
+            base = _c_string(data, unicode_offsets[0], True)
+        else:
+            base = _c_string(data, local_base_offset)
+        return base + suffix
+
+    if flags & _COMMON_NETWORK_RELATIVE_LINK_AND_PATH_SUFFIX:
+        net_name_offset, = struct.unpack_from('<I', data, network_offset + 8)
+        if net_name_offset > 0x14:
+            net_name_unicode_offset, = struct.unpack_from('<I', data, network_offset + 20)
+            net_name = _c_string(data, network_offset + net_name_unicode_offset, True)
+        else:
+            net_name = _c_string(data, network_offset + net_name_offset)
+        return f'{net_name}\\{suffix}' if suffix else net_name
+
+    return ''
+
+# Смещение длинного имени в блоке расширения 0xBEEF0004 по версии блока
+_LONG_NAME_OFFSETS = ((9, 46), (8, 42), (7, 38), (3, 20))
+
+# Имя файла или папки из элемента списка идентификаторов: длинное имя из блока расширения, иначе короткое
+def _file_entry_name(item: bytes) -> str:
+    unicode = bool(item[0] & 0x04)
+    short_name = _c_string(item, 12, unicode)
+
+    extension = item.find(b'\x04\x00\xef\xbe')
+    if extension >= 4:
+        block = extension - 4
+        version, = struct.unpack_from('<H', item, block + 2)
+        for min_version, offset in _LONG_NAME_OFFSETS:
+            if version >= min_version:
+                long_name = _c_string(item, block + offset, True)
+                return long_name or short_name
+
+    return short_name
+
+# Путь из списка идентификаторов оболочки: диск и цепочка папок до файла (пусто - не файловый путь)
+def _id_list_path(data: bytes) -> str:
+    parts = []
+    offset = 0
+    while offset + 2 <= len(data):
+        size, = struct.unpack_from('<H', data, offset)
+        if size < 3:
+            break
+        item = data[offset + 2:offset + size]
+        offset += size
+
+        kind = item[0] & 0x70
+        if kind == 0x20: # Диск
+            parts = [_c_string(item, 1).rstrip('\\')]
+        elif kind == 0x30 and parts: # Папка или файл
+            parts.append(_file_entry_name(item))
+
+    return '\\'.join(parts) if len(parts) > 1 else ''
+
+# Подстановка переменных окружения Windows (%ProgramFiles% и т.п.), без учета регистра имени
+def expand_windows_vars(path: str) -> str:
+    environ = {key.upper(): value for key, value in os.environ.items()}
+    return re.sub(r'%([^%]+)%', lambda m: environ.get(m.group(1).upper(), m.group(0)), path)
+
+# Разбор содержимого ярлыка: словарь с путем к цели, аргументами, рабочей папкой, описанием и значком
+# Путь из LinkInfo, иначе из блока переменных окружения, иначе из списка идентификаторов,
+# иначе относительный путь (как записан в ярлыке)
+def parse_lnk(data: bytes) -> dict[str, str]:
+    if len(data) < _HEADER_SIZE or struct.unpack_from('<I', data, 0)[0] != _HEADER_SIZE or data[4:20] != _LINK_CLSID:
+        raise ValueError('Не ярлык Windows')
+
+    try:
+        flags, = struct.unpack_from('<I', data, 20)
+        unicode = bool(flags & _IS_UNICODE)
+        offset = _HEADER_SIZE
+
+        # Список идентификаторов оболочки
+        id_list_path = ''
+        if flags & _HAS_LINK_TARGET_ID_LIST:
+            id_list_size, = struct.unpack_from('<H', data, offset)
+            id_list_path = _id_list_path(data[offset + 2:offset + 2 + id_list_size])
+            offset += 2 + id_list_size
+
+        # Информация о расположении цели
+        link_info_path = ''
+        if flags & _HAS_LINK_INFO:
+            link_info_size, = struct.unpack_from('<I', data, offset)
+            link_info_path = _link_info_path(data[offset:offset + link_info_size])
+            offset += link_info_size
+
+        # Строки: количество символов и символы
+        strings = {}
+        for flag, key in ((_HAS_NAME, 'description'), (_HAS_RELATIVE_PATH, 'relative_path'),
+                        (_HAS_WORKING_DIR, 'working_dir'), (_HAS_ARGUMENTS, 'arguments'),
+                        (_HAS_ICON_LOCATION, 'icon_location')):
+            if flags & flag:
+                count, = struct.unpack_from('<H', data, offset)
+                offset += 2
+                size = count * 2 if unicode else count
+                raw = data[offset:offset + size]
+                strings[key] = raw.decode('utf-16-le' if unicode else _ANSI_ENCODING, errors='replace')
+                offset += size
+
+        # Блоки дополнительных данных: ищем путь через переменные окружения
+        environment_path = ''
+        while offset + 8 <= len(data):
+            block_size, signature = struct.unpack_from('<II', data, offset)
+            if block_size < 8:
+                break
+            if signature == _ENVIRONMENT_VARIABLE_BLOCK and block_size >= 0x314:
+                environment_path = _c_string(data, offset + 268, True) or _c_string(data, offset + 8)
+            offset += block_size
+
+    except struct.error as e:
+        raise ValueError(f'Поврежденный ярлык: {e}')
+
+    path = link_info_path or expand_windows_vars(environment_path) or id_list_path or strings.get('relative_path', '')
+
+    return {
+        'path': path,
+        'arguments': strings.get('arguments', ''),
+        'working_dir': strings.get('working_dir', ''),
+        'description': strings.get('description', ''),
+        'icon_location': strings.get('icon_location', ''),
+        'relative_path': strings.get('relative_path', '')
+    }
+
+# Разбор файла ярлыка, относительный путь разрешается от папки ярлыка
+def read_lnk(lnk_path: str) -> dict[str, str]:
+    with open(lnk_path, 'rb') as f:
+        result = parse_lnk(f.read())
+
+    if result['path'] and result['path'] == result['relative_path']:
+        result['path'] = os.path.normpath(os.path.join(os.path.dirname(lnk_path), result['path']))
+
+    return result
+
+# Содержимое простого ярлыка на локальный файл (для проверки разбора и замеров)
+def build_lnk(target: str, description: str = '', arguments: str = '') -> bytes:
+    flags = _HAS_LINK_INFO | _IS_UNICODE | (_HAS_NAME if description else 0) | (_HAS_ARGUMENTS if arguments else 0)
+    header = struct.pack('<I16sII', _HEADER_SIZE, _LINK_CLSID, flags, 0) + bytes(_HEADER_SIZE - 28)
+
+    # LinkInfo с однобайтовыми и Unicode-строками пути
+    volume_id = struct.pack('<IIII', 0x11, 3, 0, 0x10) + b'\x00'
+    local_base = target.encode(_ANSI_ENCODING, errors='replace') + b'\x00'
+    local_base_unicode = target.encode('utf-16-le') + b'\x00\x00'
+
+    volume_id_offset = 0x24
+    local_base_offset = volume_id_offset + len(volume_id)
+    suffix_offset = local_base_offset + len(local_base)
+    local_base_unicode_offset = suffix_offset + 1
+    suffix_unicode_offset = local_base_unicode_offset + len(local_base_unicode)
+    link_info_size = suffix_unicode_offset + 2
+
+    link_info = struct.pack(
+        '<IIIIIIIII', link_info_size, 0x24, _VOLUME_ID_AND_LOCAL_BASE_PATH, volume_id_offset,
+        local_base_offset, 0, suffix_offset, local_base_unicode_offset, suffix_unicode_offset
+    ) + volume_id + local_base + b'\x00' + local_base_unicode + b'\x00\x00'
+
+    string_data = b''
+    for value in (description, arguments):
+        if value:
+            string_data += struct.pack('<H', len(value.encode('utf-16-le')) // 2) + value.encode('utf-16-le')
+
+    # Завершающий блок дополнительных данных
+    return header + link_info + string_data + bytes(4)
@@ -2,9 +2,12 @@ import os
 import sys
 import threading
 
+from concurrent.futures import ThreadPoolExecutor
+import queue
+
 from datetime import datetime
+import hashlib
 import json
-from tqdm import tqdm
 
 import logging
 
@@ -14,13 +17,14 @@ import pystray
 from PIL import Image, ImageDraw, ImageFont
 
 from agents import BaseAIAgentManager, AIAgentMessage
-from assistagents import AppListAgent, AssistantAgent, LaunchAppAgent
-from gigagents import new_app_description
+from assistagents import AppListAgent, AssistantAgent, LaunchAppAgent, calibrate_fast_path
+from bootstrap import bootstrap_functions, sync_functions
+from dialogdb import DialogHistory, launched_function_id
 from osinfo import os_app_list
-from semsearch import RubertTiny2SemanticSearch
-from funcdb import function_id_by_command, function_type_id, save_function, save_prompt
+from semsearch import semantic_search
+from funcdb import load_embedding_index, save_prompt
 from funceditor import FunctionEditorWindow
-from utilities import set_main_folder, main_folder, config_value, set_config_value, set_logging_level, main_logger
+from utilities import set_main_folder, main_folder, config_value, config_bool, config_float, config_int, config_str, config_read_count, set_config_value, set_logging_level, main_logger
 
 # Путь к папкам скрипта
 script_path = os.path.dirname(os.path.abspath(__file__))
@@ -52,76 +56,18 @@ class AIAgentManager(BaseAIAgentManager):
 # Экземпляр менеджера AI-агентов
 AGENT_MANAGER = AIAgentManager()
 
-# История диалогов
-class DialogHistory:
-    def __init__(self):
-        # Получение логгера
-        self._logger = main_logger()
-
-        # Установка имени файла истории
-        history_file_name = config_value(None, 'DIALOG_HISTORY', 'file_name')
-        if history_file_name is None:
-            raise Exception('Не указан файл истории диалогов')
-        self.history_file_path = os.path.join(main_folder(), history_file_name)
-
-        # Загрузка истории
-        self._dialogs = self._load_history()
-    
-    #Загрузка истории
-    def _load_history(self):
-        try:
-            if os.path.exists(self.history_file_path):
-                with open(self.history_file_path, 'r', encoding='utf-8') as f:
-                    return json.load(f)
-                    
-        except Exception as e:
-            # Логгирование на уровне отладки
-            self._logger.debug(f"Ошибка загрузки истории: {e}")
-
-        return []
-
-    # Сохранение истории    
-    def _save_history(self):
-        try:
-            with open(self.history_file_path, 'w', encoding='utf-8') as f:
-                json.dump(self._dialogs, f, ensure_ascii=False, indent=2)
-
-        except Exception as e:
-            raise Exception(f"Ошибка сохранения истории: {e}")
-
-    # Добавление нового диалога    
-    def add_dialog(self, user_query, ai_response, solved=None):
-        dialog = {
-            'id': len(self._dialogs) + 1,
-            'timestamp': datetime.now().isoformat(),
-            'user_query': user_query,
-            'ai_response': ai_response,
-            'solved': solved  # None, True, False
-        }
-        self._dialogs.append(dialog)
-
-        # Сохранение истории
-        self._save_history()
-
-        return dialog
-    
-    # Установка статуса диалога
-    def set_dialog_solved(self, dialog_id, solved):
-        if 0 <= dialog_id - 1 < len(self._dialogs):
-            self._dialogs[dialog_id - 1]['solved'] = solved
-            self._save_history()
-            return True
-        return False
-
-    # Список последних диалогов
-    def recent_dialogs(self, count=10):
-        return self._dialogs[-count:] if self._dialogs else []
-
 # Главное окно приложения
 class MainWindow:
     def __init__(self):
         # Получение логгера
         self._logger = main_logger()
+
+        # Обработка запросов в отдельном потоке: один запрос одновременно
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='query')
+        self._query_future = None
+        self._cancel_event = None
+        self._query_events = queue.Queue() # Сообщения рабочего потока для окна
+        self.shutdown_event = threading.Event() # Завершение приложения для долгих фоновых задач
         
         # Создание окна и интерфейса
         self._create_window()
@@ -196,7 +142,16 @@ class MainWindow:
             buttons_frame, 
             text="Очистить", 
             command=self._clear_input
-        ).pack(side=tk.LEFT)
+        ).pack(side=tk.LEFT, padx=(0, 10))
+
+        # Кнопка отменить - доступна во время обработки запроса
+        self.cancel_button = ttk.Button(
+            buttons_frame, 
+            text="Отменить", 
+            command=self._cancel_query,
+            state=tk.DISABLED
+        )
+        self.cancel_button.pack(side=tk.LEFT)
         
         # Привязка клавиши Enter
         self.input_text.bind('<Control-Return>', lambda e: self._send_query())
@@ -242,21 +197,72 @@ class MainWindow:
         query = self.input_text.get(1.0, tk.END).strip()
         if not query:
             return
+
+        # Новый запрос не принимаем, пока обрабатывается предыдущий
+        if self._query_future is not None:
+            self.status_var.set("Дождитесь завершения или отмените текущий запрос")
+            return
         
         # Устанавливаем строку статуса
         self.status_var.set("Обработка запроса...")
+        self.cancel_button.config(state=tk.NORMAL)
+
+        # Запускаем обработку в рабочем потоке и ждем результат без блокировки окна
+        self._cancel_event = threading.Event()
+        self._query_future = self._executor.submit(self._process_query, query, self._cancel_event)
+        self.root.after(100, self._poll_query, query)
+
+    # Обработка запроса AI-агентами (рабочий поток)
+    def _process_query(self, query: str, cancel_event: threading.Event) -> AIAgentMessage:
+        # Создаем сообщение AI-агентам
+        question = AIAgentMessage()
+        question.content = query
+
+        # Ход работы передаем окну через очередь
+        def progress(agent, message):
+            self._query_events.put(f"Обработка запроса: {agent.__class__.__name__}...")
+
+        # Получаем ответ от AI-агентов
+        config_reads = config_read_count()
+        AGENT_MANAGER.clear_context()
+        answer = AGENT_MANAGER.answer(question, cancel_event, progress)
+
+        # Логгирование на уровне отладки: сколько раз за запрос читались с диска конфигурационные файлы
+        self._logger.debug("Чтений конфигурации за запрос: %s", config_read_count() - config_reads)
+
+        return answer
+
+    # Проверка хода обработки запроса (главный поток)
+    def _poll_query(self, query: str):
+        # Отображаем сообщения рабочего потока
+        while True:
+            try:
+                status = self._query_events.get_nowait()
+            except queue.Empty:
+                break
+            if not self._cancel_event.is_set():
+                self.status_var.set(status)
+
+        # Запрос еще обрабатывается
+        if not self._query_future.done():
+            self.root.after(100, self._poll_query, query)
+            return
+
+        future = self._query_future
+        self._query_future = None
+        self._cancel_event = None
+        self.cancel_button.config(state=tk.DISABLED)
 
-        # Обновляем форму
-        self.root.update()
-        
         try:
-            # Создаем сообщение AI-агентам
-            question = AIAgentMessage()
-            question.content = query
-            
-            # Получаем ответ от AI-агентов
-            AGENT_MANAGER.clear_context()
-            answer = AGENT_MANAGER.answer(question)
+            answer = future.result()
+
+            # Запрос отменен пользователем
+            if isinstance(answer.error, InterruptedError):
+                self.status_var.set("Запрос отменен")
+                return
+
+            if answer.error is not None:
+                raise answer.error
             
             # Добавляем диалог в историю
             dialog = self._dialog_history.add_dialog(query, answer.content, None)
@@ -280,8 +286,34 @@ class MainWindow:
             # Устанавливаем строку статуса
             self.status_var.set(f"Ошибка: {str(e)}")
 
-        # Обновляем форму
-        self.root.update()
+    # Отмена текущего запроса
+    # Обращение к агенту, которое уже выполняется, завершится, следующие - нет
+    def _cancel_query(self):
+        if self._query_future is None:
+            return
+
+        self._cancel_event.set()
+        self.cancel_button.config(state=tk.DISABLED)
+        self.status_var.set("Отмена запроса...")
+
+    # Фоновая задача в потоке обработки запросов (выполняется до следующих запросов)
+    # Ошибки задачи записываются в журнал, даже если результат никто не ждет
+    def submit_background(self, task):
+        future = self._executor.submit(task)
+        future.add_done_callback(self._log_background_error)
+        return future
+
+    # Запись ошибки завершенной фоновой задачи
+    def _log_background_error(self, future):
+        if not future.cancelled() and (e := future.exception()) is not None:
+            self._logger.error(f'Ошибка фоновой задачи: {e}')
+
+    # Остановка обработки запросов
+    def shutdown(self):
+        self.shutdown_event.set()
+        if self._cancel_event is not None:
+            self._cancel_event.set()
+        self._executor.shutdown(wait=False, cancel_futures=True)
 
     # Добавление диалога в историю
     def _add_dialog_to_history(self, dialog, interactive=None):
@@ -314,26 +346,11 @@ class MainWindow:
 
     # Диалог по индентификатору
     def _dialog_by_id(self, dialog_id: int):
-        all_dialogs = self._dialog_history.recent_dialogs(self._max_dialog_length)
-        for dialog in all_dialogs:
-            if dialog['id'] == dialog_id:
-                return dialog
-        return None
+        return self._dialog_history.dialog(dialog_id)
 
     # Вытаскиваем _function_id из ответа AI-асистента
     def _function_id_by_ai_response(self, ai_response: str):
-        if not ai_response:
-            return None
-        
-        lines = ai_response.strip().split('\n')
-        if lines:
-            # Ищем "id" и число в последней строке
-            last_line = lines[-1].strip().lower()
-            match = re.search(r'\bid[:\s]*(\d+)', last_line)
-            if match:
-                return int(match.group(1))
-        
-        return None
+        return launched_function_id(ai_response)
 
     # Добавляеv интерактивные кнопки для диалога
     def _add_interaction_buttons(self, dialog_id):
@@ -415,6 +432,9 @@ class MainWindow:
                     )
                     self._logger.debug(f"Промпт {prompt_id} сохранен для функции {function_id}")
 
+                    # Эмбеддинг нового промпта участвует в поиске
+                    self.submit_background(lambda: semantic_search().rebuild_embeddings())
+
                 else:
                     self._logger.warning(f"Не удалось извлечь function_id из ответа диалога {dialog_id}")
                     
@@ -447,10 +467,84 @@ class MainWindow:
     def run(self):
         self.root.mainloop()
 
+# Фоновая синхронизация базы функций с программами ОС: периодически и по запросу из меню трея
+class AppCatalogueSync:
+    def __init__(self, main_window):
+        self._logger = main_logger()
+        self.main_window = main_window
+
+        # Интервал синхронизации (0 - только по запросу)
+        self._interval = config_float(None, 'APP_SYNC', 'interval_minutes', 60) * 60
+
+        self._requested = threading.Event()
+        self._stopped = threading.Event()
+        self._notify = None
+        self._thread = None
+
+    # Запуск фонового потока, первая синхронизация - сразу (если задано)
+    def start(self):
+        if self._thread is not None:
+            return
+
+        if config_bool(None, 'APP_SYNC', 'on_start', True):
+            self._requested.set()
+
+        self._thread = threading.Thread(target=self._run, name='app_sync', daemon=True)
+        self._thread.start()
+
+    # Запрос внеочередной синхронизации, notify(message) получит ее результат
+    def request(self, notify=None):
+        self._notify = notify
+        self._requested.set()
+
+    # Остановка фонового потока
+    def stop(self):
+        self._stopped.set()
+        self._requested.set()
+
+    # Цикл фонового потока
+    def _run(self):
+        while True:
+            self._requested.wait(self._interval if self._interval > 0 else None)
+            if self._stopped.is_set():
+                return
+
+            self._requested.clear()
+            notify, self._notify = self._notify, None
+
+            message = self._sync()
+            if notify is not None and message:
+                notify(message)
+
+    # Синхронизация, результат - сообщение для пользователя
+    def _sync(self) -> str:
+        # Первоначальное заполнение базы функций еще не завершено
+        if config_bool(None, 'MAIN', 'first_run', True):
+            return 'Заполнение базы функций еще не завершено'
+
+        try:
+            added, updated, retired = sync_functions(os_app_list(), self._stopped)
+
+            # Эмбеддинги новых и измененных функций - в потоке обработки запросов, между запросами
+            # Результат сообщаем после пересчета: до него новые функции не находятся (ошибку записывает submit_background)
+            if added or updated:
+                try:
+                    self.main_window.submit_background(lambda: semantic_search().rebuild_embeddings()).result()
+
+                except Exception:
+                    return f'Программ добавлено: {added}, обновлено: {updated}, удалено: {retired}. Ошибка пересчета эмбеддингов'
+
+            return f'Программ добавлено: {added}, обновлено: {updated}, удалено: {retired}'
+
+        except Exception as e:
+            self._logger.error(f'Ошибка синхронизации программ: {e}')
+            return 'Ошибка синхронизации программ'
+
 # Иконка в системном трее
 class SystemTray:
-    def __init__(self, main_window):
+    def __init__(self, main_window, app_sync: AppCatalogueSync):
         self.main_window = main_window
+        self.app_sync = app_sync
         self._create_tray()
 
     # Создание иконки в ситемном трее
@@ -471,6 +565,7 @@ class SystemTray:
             menu=pystray.Menu(
                 pystray.MenuItem("Открыть диалог", self._show_window),
                 pystray.MenuItem("Редактор функций", self._open_function_editor),
+                pystray.MenuItem("Синхронизировать программы", self._sync_apps),
                 pystray.MenuItem("Выход", self._exit_app)
             )
         )
@@ -495,10 +590,22 @@ class SystemTray:
         except Exception as e:
             logger.error(f'Ошибка запуска редактора функций: {e}')
 
+    # Внеочередная синхронизация программ, результат - в уведомлении
+    def _sync_apps(self, icon=None, item=None):
+        self.app_sync.request(self._notify)
+
+    # Уведомление пользователя
+    def _notify(self, message: str):
+        if self.icon.HAS_NOTIFICATION:
+            self.icon.notify(message=message, title='OS Assistant')
+
     # Выход из приложения   
     def _exit_app(self, icon=None, item=None):
         icon.stop()
 
+        self.app_sync.stop()
+        self.main_window.shutdown()
+
         self.main_window.root.quit()
         self.main_window.root.destroy()
 
@@ -509,53 +616,103 @@ class SystemTray:
         self.icon.run_detached()
         threading.Timer(3.0, self._show_startup_notification).start()
 
-# Первоначальная инициализация приложения
-def first_init_application():
-    if config_value(None, 'MAIN', 'first_run', 'True'):
+# Первоначальная инициализация приложения, прерывается установкой shutdown_event
+def first_init_application(shutdown_event: threading.Event | None = None):
+    if not config_value(None, 'MAIN', 'first_run', 'True'):
+        return
+
+    # Флаг снимаем, только когда обработаны все программы, иначе продолжим при следующем запуске
+    if bootstrap_functions(os_app_list(), shutdown_event):
         set_config_value(None, 'MAIN', 'first_run', 'False')
 
-    else:
-        return
+# Ключ подбора порогов: модель эмбеддингов и отмеченные диалоги с их статусом
+def _calibration_key(model_name: str, dialogs: list[dict]) -> str:
+    data = json.dumps([model_name, [(dialog['id'], dialog['solved']) for dialog in dialogs]])
+    return hashlib.sha256(data.encode('utf-8')).hexdigest()[:16]
 
+# Подбор порогов быстрого запуска по диалогам, отмеченным пользователем
+# Подбор повторяется, только если появились новые отмеченные диалоги (или сменились статусы, модель)
+def calibrate_fast_path_thresholds(searcher):
     logger = main_logger()
-    
-    app_list = os_app_list()
-    launch_app_id = function_type_id('Launch application')
-    
-    for app_info in tqdm(app_list, desc='Заполнение базы функций операционной системы'):
-        try:
-            result = json.loads(new_app_description(app_info))
-            if result['description']:
-                save_function(
-                    function_id_by_command(app_info['command']),
-                    app_info['name'],
-                    launch_app_id,
-                    result['description'],
-                    app_info['command']
-                )
 
-        except Exception as e:
-            logger.error(f'Ошибка заполнения базы функций: {e}')
+    dialogs = DialogHistory().solved_dialogs(config_int(None, 'FAST_PATH', 'calibration_dialogs', 1000))
+    calibration_key = _calibration_key(searcher.model_name, dialogs)
+    if calibration_key == config_str(None, 'FAST_PATH', 'calibration_key', ''):
+        logger.info('Пороги быстрого запуска не пересчитываются: отмеченные диалоги не изменились')
+        return
+
+    thresholds = calibrate_fast_path(
+        searcher,
+        dialogs,
+        config_float(None, 'FAST_PATH', 'min_precision', 0.95),
+        config_int(None, 'FAST_PATH', 'min_samples', 20)
+    )
+
+    # Без подобранных порогов быстрый запуск по близости выключен
+    if thresholds is None:
+        logger.info(f'Пороги быстрого запуска не подобраны: мало диалогов или точность недостижима ({len(dialogs)} диалогов)')
+        if config_bool(None, 'FAST_PATH', 'calibrated', False):
+            set_config_value(None, 'FAST_PATH', 'calibrated', False)
+
+    else:
+        min_score, min_margin = thresholds
+        set_config_value(None, 'FAST_PATH', 'min_score', min_score)
+        set_config_value(None, 'FAST_PATH', 'min_margin', min_margin)
+        set_config_value(None, 'FAST_PATH', 'calibrated', True)
+        logger.info(f'Пороги быстрого запуска: близость {min_score}, отрыв {min_margin}')
+
+    set_config_value(None, 'FAST_PATH', 'calibration_key', calibration_key)
+
+# Подготовка приложения: первоначальная инициализация и пересчет эмбеддингов
+def prepare_application(shutdown_event: threading.Event | None = None):
+    logger = main_logger()
 
-# Главная функция
-def main():
     try:
         # Первоначальная инициализация
-        first_init_application()
+        first_init_application(shutdown_event)
 
-        # Пересчет эмбеддингов
-        # TODO Не оптимально
-        searcher = RubertTiny2SemanticSearch()
-        searcher.rebuild_embeddings()
+        # Приложение завершается - остальная подготовка не нужна
+        if shutdown_event is not None and shutdown_event.is_set():
+            return
+
+        # Пересчет эмбеддингов, изменившихся с прошлого запуска
+        searcher = semantic_search()
+        encoded_count = searcher.rebuild_embeddings()
+        logger.info(f'Пересчитано эмбеддингов: {encoded_count}')
+
+        # Индекс эмбеддингов (и приближенный индекс) готов к первому запросу
+        load_embedding_index()
+
+        # Пороги быстрого запуска по истории диалогов
+        if config_bool(None, 'FAST_PATH', 'calibrate', False):
+            calibrate_fast_path_thresholds(searcher)
 
+    except Exception as e:
+        logger.error(f'Ошибка подготовки приложения: {e}')
+
+# Главная функция
+def main():
+    try:
         # Создаем и скрываем главное окно
         main_window = MainWindow()
         main_window.root.withdraw()
         
+        # Синхронизация программ - отдельный поток
+        app_sync = AppCatalogueSync(main_window)
+
         # Иконка в трее - отдельный поток
-        tray = SystemTray(main_window)
+        tray = SystemTray(main_window, app_sync)
         tray_thread = threading.Thread(target=tray.run, daemon=True)
         tray_thread.start()
+
+        # Модель эмбеддингов загружается в фоне, обращения к ней дождутся готовности
+        semantic_search().warm_up()
+
+        # Подготовка базы функций в потоке обработки запросов: запросы выполнятся после нее
+        main_window.submit_background(lambda: prepare_application(main_window.shutdown_event))
+
+        # Синхронизация программ начинается после подготовки базы функций
+        main_window.submit_background(app_sync.start)
         
         # Главный цикл - основной поток
         main_window.run()
@@ -1,10 +1,22 @@
 import os
 from pathlib import Path
 
-import winshell
-from winshell import shortcut
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import json
+import ntpath
+import time
 
-from utilities import main_logger
+# winshell (COM) нужен только для ярлыков, которые не разобрал lnkparser
+try:
+    import pythoncom
+    import winshell
+    from winshell import shortcut
+except ImportError:
+    winshell = None
+
+from lnkparser import read_lnk
+from utilities import config_int, config_str, main_folder, main_logger
 
 # Базовый список приложений
 def _default_app_list():
@@ -33,38 +45,209 @@ def _default_app_list():
 
     return app_list
 
-# Список приложений в меню кнопки "Пуск"
-def _start_menu_app_list():
-    app_list = []
+# Пути к меню "Пуск": общее для всех пользователей и для текущего пользователя
+def _start_menu_folders() -> list[Path]:
+    if winshell is not None:
+        return [Path(winshell.folder('CSIDL_COMMON_PROGRAMS')), Path(winshell.folder('CSIDL_PROGRAMS'))]
+
+    programs = Path('Microsoft', 'Windows', 'Start Menu', 'Programs')
+    return [Path(os.environ[name]) / programs for name in ('ProgramData', 'APPDATA') if os.environ.get(name)]
+
+# Все ярлыки папки и вложенных папок с отметкой изменения: {путь: (mtime_ns, size)}
+def _find_shortcuts(folders: list[Path]) -> dict[str, tuple[int, int]]:
+    result = {}
+    for folder in folders:
+        for dir_path, _, file_names in os.walk(folder):
+            for file_name in file_names:
+                if file_name.lower().endswith('.lnk'):
+                    lnk_path = os.path.join(dir_path, file_name)
+                    try:
+                        stat = os.stat(lnk_path)
+                        result[lnk_path] = (stat.st_mtime_ns, stat.st_size)
+                    except OSError:
+                        pass
+
+    return result
+
+# Описание программы из ярлыка
+# Ярлык без пути к файлу (например, "объявленный" ярлык установщика) - ошибка, его читает winshell
+def _shortcut_app(lnk_path: str) -> dict:
+    lnk = read_lnk(lnk_path)
+    if not lnk['path']:
+        raise ValueError('Не удалось определить цель ярлыка')
+
+    return {
+        'name': Path(lnk_path).stem, # Имя файла
+        'command': lnk['path'], # Путь к исполняемому файлу
+        'description': lnk['description'] # Описание
+    }
+
+# Описание программы из ярлыка через winshell (COM должен быть инициализирован в вызывающем потоке)
+def _winshell_shortcut_app(lnk_path: str) -> dict:
+    lnk = shortcut(lnk_path)
+    if not lnk.path:
+        raise ValueError('Не удалось определить цель ярлыка')
 
+    return {
+        'name': Path(lnk_path).stem,
+        'command': lnk.path,
+        'description': lnk.description if lnk.description else ''
+    }
+
+# Загрузка кэша ярлыков: {путь: {'mtime': ..., 'size': ..., 'app': {...}}}
+def _load_shortcut_cache(cache_path: str) -> dict:
+    try:
+        if os.path.exists(cache_path):
+            with open(cache_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+
+    except Exception as e:
+        main_logger().warning(f'Ошибка загрузки кэша ярлыков: {e}')
+
+    return {}
+
+# Сохранение кэша ярлыков (через временный файл, чтобы не повредить при прерывании)
+def _save_shortcut_cache(cache_path: str, cache: dict):
+    try:
+        temp_path = f'{cache_path}.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(cache, f, ensure_ascii=False)
+        os.replace(temp_path, cache_path)
+
+    except Exception as e:
+        main_logger().warning(f'Ошибка сохранения кэша ярлыков: {e}')
+
+# Программы из ярлыков папок: ярлыки разбираются в пуле потоков,
+# из кэша берутся ярлыки с прежними временем изменения и размером (cache_path None - без кэша)
+def scan_shortcuts(folders: list[Path], cache_path: str | None = None, max_workers: int = 8) -> list[dict]:
     logger = main_logger()
 
-    # Пути к меню "Пуск"
-    start_menu_paths = [
-        Path(winshell.folder('CSIDL_COMMON_PROGRAMS')),  # Общее для всех пользователей
-        Path(winshell.folder('CSIDL_PROGRAMS')),         # Для текущего пользователя
+    shortcuts = _find_shortcuts(folders)
+    cache = _load_shortcut_cache(cache_path) if cache_path else {}
+
+    # Новые и измененные ярлыки, а также сохраненные прежними версиями записи без команды
+    changed = [
+        lnk_path for lnk_path, (mtime, size) in shortcuts.items()
+        if (entry := cache.get(lnk_path)) is None or entry['mtime'] != mtime or entry['size'] != size
+        or not entry['app']['command']
     ]
 
-    for start_path in start_menu_paths:
-        if not start_path.exists():
+    # Разбор в пуле потоков, ошибки - отдельно
+    def parse(lnk_path: str):
+        try:
+            return _shortcut_app(lnk_path), None
+        except Exception as e:
+            return None, e
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix='shortcuts') as executor:
+        parsed = list(executor.map(parse, changed))
+
+    # Не разобранные ярлыки (в т.ч. без цели) пробуем прочитать через winshell
+    # Сканирование идет в фоновых потоках (обработки запросов, синхронизации программ), COM инициализируем здесь
+    failed = [i for i, (app_info, _) in enumerate(parsed) if app_info is None]
+    if failed and winshell is not None:
+        pythoncom.CoInitialize()
+        try:
+            for i in failed:
+                try:
+                    parsed[i] = _winshell_shortcut_app(changed[i]), None
+                except Exception as e:
+                    parsed[i] = None, e
+        finally:
+            pythoncom.CoUninitialize()
+
+    changed_paths = set(changed)
+    new_cache = {lnk_path: cache[lnk_path] for lnk_path in shortcuts if lnk_path not in changed_paths}
+    for lnk_path, (app_info, error) in zip(changed, parsed):
+        # Ярлыки без программы в кэш не попадают, при следующем сканировании читаются заново
+        if app_info is None:
+            logger.error(f'Не удалось прочитать ярлык {lnk_path}: {error}')
             continue
 
-        # Ищем все ярлыки
-        for lnk_path in start_path.rglob('*.lnk'):
-            try:
-                lnk = shortcut(str(lnk_path))
-                app_info = {
-                    'name': lnk_path.stem, # Имя файла
-                    'command': lnk.path if lnk.path else '',  # Путь к исполняемому файлу
-                    'description': lnk.description if lnk.description else ''  # Описание
-                }
-                app_list.append(app_info)
+        mtime, size = shortcuts[lnk_path]
+        new_cache[lnk_path] = {'mtime': mtime, 'size': size, 'app': app_info}
 
-            except Exception as e:
-                logger.error(f'Не удалось прочитать ярлык {lnk_path}: {e}')
+    # Кэш перезаписывается, только если что-то изменилось (в т.ч. удалены ярлыки)
+    if cache_path and (changed or len(new_cache) != len(cache)):
+        _save_shortcut_cache(cache_path, new_cache)
 
-    return app_list
+    logger.info(f'Ярлыки меню "Пуск": всего {len(shortcuts)}, прочитано {len(changed)}')
+
+    return [new_cache[lnk_path]['app'] for lnk_path in shortcuts if lnk_path in new_cache]
+
+# Ключ команды для поиска повторов: нормализованный путь Windows без учета регистра
+def _command_key(command: str) -> str:
+    return ntpath.normcase(ntpath.normpath(command))
 
-# Список приложений для запуска
+# Хэш описания программы: меняется при переименовании ярлыка, смене цели или описания
+def app_info_hash(app_info: dict) -> str:
+    data = json.dumps([app_info['name'], app_info['command'], app_info.get('description', '')], ensure_ascii=False)
+    return hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+# Список приложений в меню кнопки "Пуск"
+def _start_menu_app_list():
+    cache_file_name = config_str(None, 'START_MENU', 'cache_file_name', 'start_menu_cache.json')
+    max_workers = config_int(None, 'START_MENU', 'max_workers', 8)
+
+    folders = [folder for folder in _start_menu_folders() if folder.exists()]
+    return scan_shortcuts(folders, os.path.join(main_folder(), cache_file_name), max_workers)
+
+# Список приложений для запуска: без ярлыков без команды и без повторов одной программы
 def os_app_list():
-    return _default_app_list() + _start_menu_app_list()
\ No newline at end of file
+    app_list = []
+    commands = set()
+    for app_info in _default_app_list() + _start_menu_app_list():
+        key = _command_key(app_info['command'])
+        if app_info['command'] and key not in commands:
+            commands.add(key)
+            app_list.append(app_info)
+
+    return app_list
+
+# Замер сканирования на синтетическом дереве ярлыков: python osinfo.py [ярлыков] [потоков]
+if __name__ == '__main__':
+    import shutil
+    import sys
+    import tempfile
+
+    from lnkparser import build_lnk
+    from utilities import set_main_folder
+
+    shortcut_count = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    max_workers = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+
+    temp_folder = tempfile.mkdtemp()
+    set_main_folder(temp_folder)
+    try:
+        # Дерево папок по 50 ярлыков, у каждой пятой программы два ярлыка
+        root = Path(temp_folder, 'Programs')
+        for i in range(shortcut_count):
+            folder = root / f'Vendor {i // 50}'
+            folder.mkdir(parents=True, exist_ok=True)
+            target = f'C:\\Program Files\\Vendor {i // 50}\\app{i - i % 5 if i % 5 == 1 else i}.exe'
+            (folder / f'Программа {i}.lnk').write_bytes(build_lnk(target, f'Описание программы {i}'))
+
+        cache_path = os.path.join(temp_folder, 'cache.json')
+
+        def measure(title: str, **kwargs):
+            start_time = time.perf_counter()
+            apps = scan_shortcuts([root], **kwargs)
+            print(f'{title}: {1000 * (time.perf_counter() - start_time):.0f} мс, программ {len(apps)}')
+
+        print(f'Ярлыков {shortcut_count}, потоков {max_workers}')
+        measure('Без кэша, 1 поток', max_workers=1)
+        measure(f'Без кэша, {max_workers} потоков', max_workers=max_workers)
+        measure('Первое сканирование с кэшем', cache_path=cache_path, max_workers=max_workers)
+        measure('Повторное сканирование', cache_path=cache_path, max_workers=max_workers)
+
+        # Изменено 5% ярлыков
+        for i in range(0, shortcut_count, 20):
+            (root / f'Vendor {i // 50}' / f'Программа {i}.lnk').write_bytes(build_lnk(f'C:\\New\\app{i}.exe'))
+        measure('После изменения 5% ярлыков', cache_path=cache_path, max_workers=max_workers)
+
+        apps = scan_shortcuts([root], cache_path=cache_path, max_workers=max_workers)
+        unique = {_command_key(app_info['command']) for app_info in apps if app_info['command']}
+        print(f'Уникальных команд {len(unique)} из {len(apps)}')
+
+    finally:
+        shutil.rmtree(temp_folder, ignore_errors=True)
@@ -1,46 +1,249 @@
 import os
+import threading
 
 from abc import ABC, abstractmethod
+import atexit
+from collections import OrderedDict
+from concurrent.futures import Future
+import json
 import numpy as np
+import re
+import time
 
-from sentence_transformers import SentenceTransformer
-
-from funcdb import functions_list, rebuild_embeddings, top_N_similar
-from utilities import main_folder, config_value
+from funcdb import function_id_by_name, functions_list, lexical_search, rebuild_embeddings, top_N_similar
+from utilities import main_folder, config_value, config_bool, config_float, config_int, config_str, main_logger
 
 # Абстактный класс семантического поиска
 class BaseSemanticSearch:
+    # Идентификатор модели эмбеддингов
+    @property
+    @abstractmethod
+    def model_name(self) -> str:
+        pass
+
+    # Запуск фоновой загрузки модели, результат - future готовности модели
+    @abstractmethod
+    def warm_up(self) -> Future:
+        pass
+
     @abstractmethod
     def embeddings(self, sentences: list[str]) -> list[list[float]]:
         pass
     
     @abstractmethod
-    def rebuild_embeddings(self):
+    def rebuild_embeddings(self, incremental: bool = True) -> int:
+        pass
+
+    # Семантический поиск: [(id функции, косинусная близость)]
+    @abstractmethod
+    def semantic_ids(self, prompt: str, limit: int = 10) -> list[tuple[int, float]]:
+        pass
+
+    # Семантический поиск по готовому эмбеддингу запроса
+    @abstractmethod
+    def embedding_semantic_ids(self, embedding, limit: int = 10, exclude_prompt_text: str | None = None) -> list[tuple[int, float]]:
         pass
 
     @abstractmethod
     def functions(self, prompt: str) -> list[dict[str, str]]:
         pass
 
+# LRU-кэш эмбеддингов запросов с ограничением памяти
+# Ключ - нормализованный текст, кэш сбрасывается при смене модели
+class _QueryEmbeddingCache:
+    def __init__(self, max_size_bytes: int, file_path: str | None = None):
+        self._lock = threading.Lock()
+        self._max_size_bytes = max_size_bytes
+        self._file_path = file_path # Файл для сохранения между запусками (None - не сохранять)
+        self._model_name = None
+        self._embeddings = OrderedDict() # нормализованный текст -> эмбеддинг float32
+        self._size_bytes = 0
+
+        # Счетчики попаданий и промахов
+        self.hits = 0
+        self.misses = 0
+
+        if self._file_path:
+            self._load()
+
+    # Нормализация текста запроса: регистр, буква ё, знаки препинания и пробелы
+    @staticmethod
+    def normalize(text: str) -> str:
+        text = text.lower().replace('ё', 'е')
+        return ' '.join(re.sub(r'[^\w\s]', ' ', text).split())
+
+    # Размер записи в памяти
+    @staticmethod
+    def _entry_size(key: str, embedding: np.ndarray) -> int:
+        return embedding.nbytes + len(key) * 4
+
+    # Сброс кэша при смене модели
+    def _check_model(self, model_name: str):
+        if self._model_name != model_name:
+            self._model_name = model_name
+            self._embeddings.clear()
+            self._size_bytes = 0
+
+    # Эмбеддинг из кэша (None - нет в кэше)
+    def get(self, model_name: str, text: str) -> np.ndarray | None:
+        key = self.normalize(text)
+
+        with self._lock:
+            self._check_model(model_name)
+
+            embedding = self._embeddings.get(key)
+            if embedding is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self._embeddings.move_to_end(key)
+            return embedding
+
+    # Запись эмбеддинга, давно не использованные вытесняются при превышении памяти
+    def put(self, model_name: str, text: str, embedding):
+        key = self.normalize(text)
+        embedding = np.asarray(embedding, dtype=np.float32)
+
+        with self._lock:
+            self._check_model(model_name)
+
+            old_embedding = self._embeddings.pop(key, None)
+            if old_embedding is not None:
+                self._size_bytes -= self._entry_size(key, old_embedding)
+
+            self._embeddings[key] = embedding
+            self._size_bytes += self._entry_size(key, embedding)
+
+            while self._size_bytes > self._max_size_bytes and self._embeddings:
+                evicted_key, evicted_embedding = self._embeddings.popitem(last=False)
+                self._size_bytes -= self._entry_size(evicted_key, evicted_embedding)
+
+    # Доля попаданий
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    # Загрузка кэша из файла
+    def _load(self):
+        try:
+            if not os.path.exists(self._file_path):
+                return
+
+            with np.load(self._file_path, allow_pickle=False) as data:
+                self._model_name = str(data['model_name'])
+                for key, embedding in zip(data['keys'], data['embeddings']):
+                    self._embeddings[str(key)] = embedding
+                    self._size_bytes += self._entry_size(str(key), embedding)
+
+        except Exception as e:
+            main_logger().warning(f'Ошибка загрузки кэша эмбеддингов запросов: {e}')
+            self._embeddings.clear()
+            self._size_bytes = 0
+
+    # Сохранение кэша в файл
+    def save(self):
+        if not self._file_path:
+            return
+
+        with self._lock:
+            if self._model_name is None or not self._embeddings:
+                return
+
+            keys = np.array(list(self._embeddings.keys()))
+            embeddings = np.stack(list(self._embeddings.values()))
+            model_name = np.array(self._model_name)
+
+        try:
+            temp_path = f'{self._file_path}.tmp.npz'
+            np.savez(temp_path, model_name=model_name, keys=keys, embeddings=embeddings)
+            os.replace(temp_path, self._file_path)
+
+        except Exception as e:
+            main_logger().warning(f'Ошибка сохранения кэша эмбеддингов запросов: {e}')
+
+# Экземпляр кэша эмбеддингов запросов
+_QUERY_EMBEDDING_CACHE = None
+_QUERY_EMBEDDING_CACHE_LOCK = threading.Lock()
+
+# Кэш эмбеддингов запросов
+def _query_embedding_cache() -> _QueryEmbeddingCache:
+    global _QUERY_EMBEDDING_CACHE
+
+    with _QUERY_EMBEDDING_CACHE_LOCK:
+        if _QUERY_EMBEDDING_CACHE is None:
+            max_size_mb = config_float(None, 'QUERY_CACHE', 'max_size_mb', 4)
+            file_path = None
+            if config_bool(None, 'QUERY_CACHE', 'persist', False):
+                file_name = config_str(None, 'QUERY_CACHE', 'file_name', 'query_cache.npz')
+                file_path = os.path.join(main_folder(), file_name)
+
+            _QUERY_EMBEDDING_CACHE = _QueryEmbeddingCache(int(max_size_mb * 1024 * 1024), file_path)
+            atexit.register(_QUERY_EMBEDDING_CACHE.save)
+
+    return _QUERY_EMBEDDING_CACHE
+
 # Cемантический поиск c Rubert-Tiny2
-_MODEL_RUBERT_TINY2 = None
+# Модель загружается в фоновом потоке, future - готовность модели
+_MODEL_RUBERT_TINY2_FUTURE = None
+_MODEL_RUBERT_TINY2_LOCK = threading.Lock()
+
+# Загрузка модели (torch и sentence-transformers импортируются только здесь)
+def _load_rubert_tiny2(model_path: str, future: Future):
+    try:
+        from sentence_transformers import SentenceTransformer
+
+        future.set_result(SentenceTransformer(model_path))
+
+    except BaseException as e:
+        future.set_exception(e)
 
 class RubertTiny2SemanticSearch(BaseSemanticSearch):
-    # Экземпляр модели
+    # Путь к модели: локальная папка или имя модели в Hugging Face
+    @staticmethod
+    def _model_path() -> str:
+        folder_name = config_value(None, 'RUBERT_TINY2', 'folder_name', 'rubert-tiny2')
+        model_path = os.path.join(main_folder(), folder_name)
+        if not os.path.exists(model_path):
+            model_path ='cointegrated/rubert-tiny2'
+
+        return model_path
+
+    # Идентификатор модели: путь и время изменения файлов локальной модели
+    # Файлы экспорта в ONNX (model.onnx, model.onnx.data, model_int8.onnx) лежат в той же папке и не учитываются:
+    # экспорт не меняет модель torch и не должен вызывать пересчет ее эмбеддингов
     @property
-    def _model(self):
-        global _MODEL_RUBERT_TINY2
+    def model_name(self) -> str:
+        model_path = self._model_path()
+        if not os.path.isdir(model_path):
+            return model_path
 
-        if _MODEL_RUBERT_TINY2 is None:
-            folder_name = config_value(None, 'RUBERT_TINY2', 'folder_name', 'rubert-tiny2')
-            model_path = os.path.join(main_folder(), folder_name)
-            if not os.path.exists(model_path):
-                model_path ='cointegrated/rubert-tiny2'
+        version = max(
+            (entry.stat().st_mtime_ns for entry in os.scandir(model_path) if entry.is_file() and '.onnx' not in entry.name),
+            default=0
+        )
+        return f'{os.path.basename(model_path)}@{version}'
 
-            # Загрузка модели
-            _MODEL_RUBERT_TINY2 = SentenceTransformer(model_path)
+    # Запуск фоновой загрузки модели, результат - future готовности модели
+    def warm_up(self) -> Future:
+        global _MODEL_RUBERT_TINY2_FUTURE
 
-        return _MODEL_RUBERT_TINY2
+        with _MODEL_RUBERT_TINY2_LOCK:
+            if _MODEL_RUBERT_TINY2_FUTURE is None:
+                _MODEL_RUBERT_TINY2_FUTURE = Future()
+                threading.Thread(
+                    target=_load_rubert_tiny2,
+                    args=(self._model_path(), _MODEL_RUBERT_TINY2_FUTURE),
+                    name='rubert-tiny2-loader',
+                    daemon=True
+                ).start()
+
+            return _MODEL_RUBERT_TINY2_FUTURE
+
+    # Экземпляр модели, ожидает окончания загрузки
+    @property
+    def _model(self):
+        return self.warm_up().result()
 
     # Вычисление эмбеддингов
     def embeddings(self, sentences: list[str]) -> list[list[float]]:
@@ -52,17 +255,411 @@ class RubertTiny2SemanticSearch(BaseSemanticSearch):
 
         return embeddings.tolist()
 
-    # Пересчет эмбеддингов
-    def rebuild_embeddings(self):
-        rebuild_embeddings(self.embeddings)
+    # Эмбеддинг запроса пользователя, повторные запросы - из кэша
+    def query_embedding(self, prompt: str) -> np.ndarray:
+        cache = _query_embedding_cache()
+        model_name = self.model_name
+
+        embedding = cache.get(model_name, prompt)
+        if embedding is None:
+            embedding = np.asarray(self.embeddings([prompt])[0], dtype=np.float32)
+            cache.put(model_name, prompt, embedding)
+
+        # Логгирование на уровне отладки
+        main_logger().debug('Кэш эмбеддингов запросов: попаданий %s, промахов %s (%.0f%%)', cache.hits, cache.misses, 100 * cache.hit_rate())
+
+        return embedding
+
+    # Пересчет эмбеддингов (только измененных), количество пересчитанных
+    def rebuild_embeddings(self, incremental: bool = True) -> int:
+        return rebuild_embeddings(self.embeddings, self.model_name, incremental)
+
+    # Семантический поиск: [(id функции, косинусная близость)]
+    def semantic_ids(self, prompt: str, limit: int = 10) -> list[tuple[int, float]]:
+        # Эмбеддинг запроса -> ближайшие эмбеддинги с близостью -> id
+        return self.embedding_semantic_ids(self.query_embedding(prompt), limit)
+
+    # Семантический поиск по готовому эмбеддингу запроса
+    # exclude_prompt_text - без сохраненных промптов с этим текстом (для оценки поиска по истории диалогов)
+    def embedding_semantic_ids(self, embedding, limit: int = 10, exclude_prompt_text: str | None = None) -> list[tuple[int, float]]:
+        aggregation = config_str(None, 'SEARCH', 'aggregation', 'max')
+        return top_N_similar(embedding, limit, aggregation=aggregation, exclude_prompt_text=exclude_prompt_text)
+
+    # Id функций по тексту промпта, от лучшего совпадения
+    # Точное совпадение имени - без кодировщика, иначе слияние семантического и полнотекстового поиска
+    def function_ids(self, prompt: str, limit: int = 10) -> list[int]:
+        if config_bool(None, 'SEARCH', 'exact_name_bypass', True):
+            function_id = function_id_by_name(prompt)
+            if function_id is not None:
+                return [function_id]
+
+        semantic = [function_id for function_id, _ in self.semantic_ids(prompt, limit)]
+        if not config_bool(None, 'SEARCH', 'hybrid', True):
+            return semantic
+
+        lexical = [function_id for function_id, _ in lexical_search(prompt, limit)]
+        rrf_k = config_int(None, 'SEARCH', 'rrf_k', 60)
+        return reciprocal_rank_fusion([semantic, lexical], rrf_k)[:limit]
 
     # Поиск функций по тексту промпта
     def functions(self, prompt: str) -> list[dict[str, int | str]]:
-        # Эмбеддинг запроса -> ближайшие эмбеддинги с близостью -> id -> функции
-        embedding = self.embeddings([prompt])[0]
-        weights = top_N_similar(embedding, 10)
-        ids = [f[0] for f in weights]
-        rows = functions_list(ids)
+        ids = self.function_ids(prompt, 10)
+
+        # Функции в порядке убывания близости
+        ranks = {function_id: rank for rank, function_id in enumerate(ids)}
+        rows = sorted(functions_list(ids), key=lambda row: ranks[row[0]])
 
         columns = ['id', 'name', 'description', 'type', 'command']
         return [dict(zip(columns, row)) for row in rows]
+
+# Слияние ранжированных списков id (reciprocal rank fusion): оценка id - сумма 1 / (k + место) по спискам
+def reciprocal_rank_fusion(rankings: list[list[int]], k: int = 60) -> list[int]:
+    scores = {}
+    for ranking in rankings:
+        for rank, item_id in enumerate(ranking, start=1):
+            scores[item_id] = scores.get(item_id, 0.0) + 1.0 / (k + rank)
+
+    # При равенстве оценок сохраняется порядок первого появления
+    return sorted(scores, key=lambda item_id: -scores[item_id])
+
+# Кодировщик Rubert-Tiny2 в ONNX Runtime: тот же токенизатор, пулинг и нормализация, что у sentence-transformers
+class _OnnxRubertTiny2Encoder:
+    def __init__(self, model_path: str, onnx_path: str):
+        try:
+            import onnxruntime
+            from tokenizers import Tokenizer
+
+        except ImportError as e:
+            raise Exception(f'Для ONNX-модели rubert-tiny2 требуются пакеты onnxruntime и tokenizers: {e}')
+
+        # Сессия ONNX Runtime на CPU
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self._session = onnxruntime.InferenceSession(onnx_path, options, providers=['CPUExecutionProvider'])
+        self._input_names = {model_input.name for model_input in self._session.get_inputs()}
+
+        # Максимальная длина последовательности как у sentence-transformers
+        max_seq_length = 512
+        sbert_config_path = os.path.join(model_path, 'sentence_bert_config.json')
+        if os.path.exists(sbert_config_path):
+            with open(sbert_config_path, 'r', encoding='utf-8') as f:
+                max_seq_length = json.load(f).get('max_seq_length', max_seq_length)
+
+        # Токенизатор модели
+        self._tokenizer = Tokenizer.from_file(os.path.join(model_path, 'tokenizer.json'))
+        self._tokenizer.enable_truncation(max_length=max_seq_length)
+        self._tokenizer.enable_padding()
+
+        # Способ пулинга из настроек модели sentence-transformers
+        self._cls_pooling = False
+        pooling_config_path = os.path.join(model_path, '1_Pooling', 'config.json')
+        if os.path.exists(pooling_config_path):
+            with open(pooling_config_path, 'r', encoding='utf-8') as f:
+                pooling_config = json.load(f)
+            self._cls_pooling = bool(pooling_config.get('pooling_mode_cls_token')) or pooling_config.get('pooling_mode') == 'cls'
+
+    # Вычисление эмбеддингов, параметры совместимы с SentenceTransformer.encode
+    def encode(self, sentences: list[str], normalize_embeddings: bool = True, batch_size: int = 32, **kwargs) -> np.ndarray:
+        result = []
+
+        for start in range(0, len(sentences), batch_size):
+            encodings = self._tokenizer.encode_batch(sentences[start:start + batch_size])
+            inputs = {
+                'input_ids': np.array([e.ids for e in encodings], dtype=np.int64),
+                'attention_mask': np.array([e.attention_mask for e in encodings], dtype=np.int64),
+                'token_type_ids': np.array([e.type_ids for e in encodings], dtype=np.int64),
+            }
+            inputs = {name: value for name, value in inputs.items() if name in self._input_names}
+
+            # Выход модели - скрытые состояния токенов
+            hidden_states = self._session.run(None, inputs)[0]
+
+            # Пулинг: CLS-токен или среднее по токенам без учета паддинга
+            if self._cls_pooling:
+                pooled = hidden_states[:, 0]
+            else:
+                mask = inputs['attention_mask'][:, :, None].astype(np.float32)
+                pooled = (hidden_states * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+
+            result.append(pooled.astype(np.float32))
+
+        embeddings = np.concatenate(result) if result else np.empty((0, 0), dtype=np.float32)
+        if normalize_embeddings:
+            embeddings /= np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+
+        return embeddings
+
+# Экспорт Rubert-Tiny2 в ONNX (требуются torch и transformers) с проверкой совпадения результатов
+def export_onnx_rubert_tiny2(quantize: bool = False, tolerance: float = 1e-4) -> str:
+    import torch
+    from sentence_transformers import SentenceTransformer
+    from transformers import AutoModel, AutoTokenizer
+
+    # Папка модели: экспорт всегда в локальную папку
+    source_path = RubertTiny2SemanticSearch._model_path()
+    model_path = os.path.join(main_folder(), config_str(None, 'RUBERT_TINY2', 'folder_name', 'rubert-tiny2'))
+    if not os.path.isdir(model_path):
+        SentenceTransformer(source_path).save(model_path)
+
+    tokenizer = AutoTokenizer.from_pretrained(model_path)
+    model = AutoModel.from_pretrained(model_path)
+    model.eval()
+
+    # Экспорт с динамическими размерами пакета и последовательности
+    onnx_path = os.path.join(model_path, 'model.onnx')
+    sample = tokenizer(['Пример запроса пользователя'], return_tensors='pt')
+    input_names = [name for name in ('input_ids', 'attention_mask', 'token_type_ids') if name in sample]
+    dynamic_axes = {name: {0: 'batch', 1: 'sequence'} for name in input_names}
+    dynamic_axes['last_hidden_state'] = {0: 'batch', 1: 'sequence'}
+
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            tuple(sample[name] for name in input_names),
+            onnx_path,
+            input_names=input_names,
+            output_names=['last_hidden_state'],
+            dynamic_axes=dynamic_axes,
+            opset_version=17
+        )
+
+    # Квантизация весов в int8
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        quantized_path = os.path.join(model_path, 'model_int8.onnx')
+        quantize_dynamic(onnx_path, quantized_path, weight_type=QuantType.QInt8)
+        onnx_path = quantized_path
+
+    # Проверка: эмбеддинги ONNX и torch должны совпадать (для int8 - по косинусу)
+    sentences = ['открой блокнот', 'калькулятор', 'Простой редактор изображения']
+    expected = SentenceTransformer(model_path).encode(sentences, normalize_embeddings=True)
+    actual = _OnnxRubertTiny2Encoder(model_path, onnx_path).encode(sentences)
+    if quantize:
+        deviation = float(1.0 - np.min(np.sum(expected * actual, axis=1)))
+    else:
+        deviation = float(np.max(np.abs(expected - actual)))
+
+    if deviation > tolerance:
+        raise Exception(f'Эмбеддинги ONNX-модели отличаются от torch: {deviation:.2e} > {tolerance:.2e}')
+
+    return onnx_path
+
+# Семантический поиск c Rubert-Tiny2 в ONNX Runtime
+# Загруженные модели по пути к файлу ONNX
+_ONNX_RUBERT_TINY2_FUTURES: dict[str, Future] = {}
+
+# Загрузка ONNX-модели, при отсутствии файла - экспорт из модели torch
+def _load_onnx_rubert_tiny2(quantized: bool, future: Future):
+    try:
+        onnx_path = OnnxRubertTiny2SemanticSearch._onnx_path(quantized)
+        if not os.path.exists(onnx_path):
+            onnx_path = export_onnx_rubert_tiny2(quantized, 1e-2 if quantized else 1e-4)
+
+        future.set_result(_OnnxRubertTiny2Encoder(os.path.dirname(onnx_path), onnx_path))
+
+    except BaseException as e:
+        future.set_exception(e)
+
+class OnnxRubertTiny2SemanticSearch(RubertTiny2SemanticSearch):
+    def __init__(self, quantized: bool = False):
+        self._quantized = quantized
+
+    # Путь к файлу ONNX-модели в папке модели
+    @staticmethod
+    def _onnx_path(quantized: bool) -> str:
+        file_name = 'model_int8.onnx' if quantized else 'model.onnx'
+        folder_name = config_str(None, 'RUBERT_TINY2', 'folder_name', 'rubert-tiny2')
+        return os.path.join(main_folder(), folder_name, file_name)
+
+    # Идентификатор модели: модель, вариант ONNX и время изменения файла
+    @property
+    def model_name(self) -> str:
+        onnx_path = self._onnx_path(self._quantized)
+        version = os.stat(onnx_path).st_mtime_ns if os.path.exists(onnx_path) else 0
+        return f'{super().model_name}:{os.path.basename(onnx_path)}@{version}'
+
+    # Запуск фоновой загрузки модели, результат - future готовности модели
+    def warm_up(self) -> Future:
+        onnx_path = self._onnx_path(self._quantized)
+
+        with _MODEL_RUBERT_TINY2_LOCK:
+            future = _ONNX_RUBERT_TINY2_FUTURES.get(onnx_path)
+            if future is None:
+                future = _ONNX_RUBERT_TINY2_FUTURES[onnx_path] = Future()
+                threading.Thread(
+                    target=_load_onnx_rubert_tiny2,
+                    args=(self._quantized, future),
+                    name='rubert-tiny2-onnx-loader',
+                    daemon=True
+                ).start()
+
+            return future
+
+# Реализации модели rubert-tiny2
+SEMANTIC_SEARCH_BACKENDS = ('torch', 'onnx', 'onnx-int8')
+
+# Семантический поиск с моделью, выбранной в настройках (или заданной backend): torch, onnx или onnx-int8
+def semantic_search(backend: str | None = None) -> BaseSemanticSearch:
+    if backend is None:
+        backend = str(config_str(None, 'RUBERT_TINY2', 'backend', 'torch')).lower()
+
+    if backend == 'torch':
+        return RubertTiny2SemanticSearch()
+    if backend == 'onnx':
+        return OnnxRubertTiny2SemanticSearch()
+    if backend == 'onnx-int8':
+        return OnnxRubertTiny2SemanticSearch(quantized=True)
+
+    raise Exception(f'Неизвестная реализация модели rubert-tiny2: {backend}')
+
+# Сравнение поиска на размеченных запросах: {режим: (recall@k, мс на запрос)}
+# cases - [{"query": текст запроса, "name": имя ожидаемой функции}, ...]
+def benchmark_search(searcher: RubertTiny2SemanticSearch, cases: list[dict], k: int = 5) -> dict[str, tuple[float, float]]:
+    # Ожидаемые функции, отсутствующие в базе, не учитываются
+    labelled = []
+    for case in cases:
+        function_id = function_id_by_name(case['name'])
+        if function_id is not None:
+            labelled.append((case['query'], function_id))
+
+    modes = {
+        # Гибридный поиск первым, пока эмбеддинг запроса не попал в кэш
+        'hybrid': lambda query: searcher.function_ids(query, k),
+        'lexical': lambda query: [function_id for function_id, _ in lexical_search(query, k)],
+        'semantic': lambda query: [function_id for function_id, _ in top_N_similar(searcher.embeddings([query])[0], k)],
+    }
+
+    found = {mode: 0 for mode in modes}
+    elapsed = {mode: 0.0 for mode in modes}
+    for query, expected_id in labelled:
+        for mode, search in modes.items():
+            start_time = time.perf_counter()
+            ids = search(query)
+            elapsed[mode] += time.perf_counter() - start_time
+            found[mode] += expected_id in ids[:k]
+
+    count = max(1, len(labelled))
+    return {mode: (found[mode] / count, 1000 * elapsed[mode] / count) for mode in modes}
+
+# Пиковый объем памяти процесса, МБ (None - не удалось определить)
+def _peak_rss_mb() -> float | None:
+    # Windows: пиковый рабочий набор процесса
+    if os.name == 'nt':
+        import ctypes
+        from ctypes import wintypes
+
+        class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+            _fields_ = [('cb', wintypes.DWORD), ('PageFaultCount', wintypes.DWORD)] + [
+                (name, ctypes.c_size_t) for name in (
+                    'PeakWorkingSetSize', 'WorkingSetSize', 'QuotaPeakPagedPoolUsage', 'QuotaPagedPoolUsage',
+                    'QuotaPeakNonPagedPoolUsage', 'QuotaNonPagedPoolUsage', 'PagefileUsage', 'PeakPagefileUsage'
+                )
+            ]
+
+        counters = PROCESS_MEMORY_COUNTERS()
+        counters.cb = ctypes.sizeof(counters)
+        if ctypes.windll.psapi.GetProcessMemoryInfo(ctypes.windll.kernel32.GetCurrentProcess(), ctypes.byref(counters), counters.cb):
+            return counters.PeakWorkingSetSize / (1024 * 1024)
+        return None
+
+    # Linux: VmHWM (ru_maxrss дочернего процесса может включать пик родительского)
+    try:
+        with open('/proc/self/status', 'r') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+
+    except OSError:
+        pass
+
+    return None
+
+# Замер реализации модели в текущем процессе: холодный старт (импорт, загрузка и первый запрос), память
+# и задержка вычисления эмбеддинга одного запроса (без кэша эмбеддингов запросов)
+def benchmark_backend(backend: str, queries: list[str], repeats: int = 5) -> dict[str, float | None]:
+    start_time = time.perf_counter()
+    searcher = semantic_search(backend)
+    searcher.embeddings([queries[0]])
+    cold_start_s = time.perf_counter() - start_time
+
+    latencies = []
+    for _ in range(repeats):
+        for query in queries:
+            start_time = time.perf_counter()
+            searcher.embeddings([query])
+            latencies.append(1000 * (time.perf_counter() - start_time))
+
+    return {
+        'cold_start_s': cold_start_s,
+        'peak_rss_mb': _peak_rss_mb(),
+        'query_ms_p50': float(np.percentile(latencies, 50)),
+        'query_ms_p95': float(np.percentile(latencies, 95)),
+    }
+
+# Сравнение реализаций модели, каждая - в отдельном процессе, чтобы замеры старта и памяти не влияли друг на друга
+def benchmark_backends(queries: list[str], backends: tuple[str, ...] = SEMANTIC_SEARCH_BACKENDS) -> dict[str, dict | str]:
+    import subprocess
+    import sys
+
+    result = {}
+    for backend in backends:
+        # Файл ONNX создается заранее, экспорт (с загрузкой torch) не входит в замер
+        if backend != 'torch' and not os.path.exists(OnnxRubertTiny2SemanticSearch._onnx_path(backend == 'onnx-int8')):
+            try:
+                export_onnx_rubert_tiny2(backend == 'onnx-int8', 1e-2 if backend == 'onnx-int8' else 1e-4)
+
+            except Exception as e:
+                result[backend] = str(e)
+                continue
+
+        process = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--backend-probe', backend, main_folder()],
+            input=json.dumps(queries, ensure_ascii=False), capture_output=True, text=True, encoding='utf-8'
+        )
+        if process.returncode == 0:
+            result[backend] = json.loads(process.stdout.strip().splitlines()[-1])
+        else:
+            result[backend] = process.stderr.strip().splitlines()[-1] if process.stderr.strip() else 'ошибка'
+
+    return result
+
+# Запуск сравнения поиска: python semsearch.py [файл с размеченными запросами]
+# Сравнение реализаций модели: python semsearch.py --backends [файл с размеченными запросами]
+if __name__ == '__main__':
+    import sys
+    from utilities import set_main_folder
+
+    # Замер одной реализации в дочернем процессе: запросы - JSON во входном потоке, результат - JSON в выходном
+    if len(sys.argv) > 3 and sys.argv[1] == '--backend-probe':
+        set_main_folder(sys.argv[3])
+        print(json.dumps(benchmark_backend(sys.argv[2], json.load(sys.stdin))))
+        sys.exit(0)
+
+    # Основная папка - папка скрипта, как при запуске приложения
+    set_main_folder(os.path.dirname(os.path.abspath(__file__)))
+
+    compare_backends = len(sys.argv) > 1 and sys.argv[1] == '--backends'
+    args = sys.argv[2:] if compare_backends else sys.argv[1:]
+
+    cases_path = args[0] if args else os.path.join(main_folder(), 'search_benchmark.json')
+    with open(cases_path, 'r', encoding='utf-8') as f:
+        cases = json.load(f)
+
+    if compare_backends:
+        for backend, stats in benchmark_backends([case['query'] for case in cases]).items():
+            if isinstance(stats, str):
+                print(f'{backend:9s}  недоступна: {stats}')
+                continue
+
+            rss = f'{stats["peak_rss_mb"]:.0f} МБ' if stats['peak_rss_mb'] is not None else '-'
+            print(
+                f'{backend:9s}  старт {stats["cold_start_s"]:.2f} с  память {rss}  '
+                f'запрос p50 {stats["query_ms_p50"]:.1f} мс, p95 {stats["query_ms_p95"]:.1f} мс'
+            )
+        sys.exit(0)
+
+    searcher = semantic_search()
+    searcher.rebuild_embeddings()
+    for mode, (recall, latency_ms) in benchmark_search(searcher, cases).items():
+        print(f'{mode:8s}  recall@5={recall:.3f}  {latency_ms:.1f} мс')
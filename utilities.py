@@ -1,7 +1,11 @@
 import os
 
+import atexit
 import configparser
 import logging
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+import queue
+import threading
 
 # Путь к папке конфигурации
 _MAIN_FOLDER_PATH = None
@@ -17,17 +21,51 @@ def main_folder() -> str:
         raise Exception('Путь к папке AI-асистента не установлен')
     return _MAIN_FOLDER_PATH
 
+# Разобранные конфигурационные файлы: путь -> (время изменения, размер, парсер)
+_CONFIG_CACHE: dict[str, tuple[int | None, int | None, configparser.ConfigParser]] = {}
+_CONFIG_LOCK = threading.Lock()
+# Количество чтений конфигурационных файлов с диска
+_CONFIG_READ_COUNT = 0
+
+# Путь к конфигурационному файлу (None - config.ini в основной папке)
+def _config_path(path: str | None) -> str:
+    return os.path.join(main_folder(), 'config.ini') if path is None else path
+
+# Разобранный конфигурационный файл: читается с диска, только если изменились время изменения или размер
+def _config_parser(config_path: str) -> configparser.ConfigParser:
+    global _CONFIG_READ_COUNT
+
+    try:
+        stat = os.stat(config_path)
+        mtime, size = stat.st_mtime_ns, stat.st_size
+    except OSError:
+        mtime, size = None, None
+
+    with _CONFIG_LOCK:
+        cached = _CONFIG_CACHE.get(config_path)
+        if cached is not None and cached[0] == mtime and cached[1] == size:
+            return cached[2]
+
+        parser = configparser.ConfigParser()
+        parser.read(config_path)
+        _CONFIG_READ_COUNT += 1
+
+        _CONFIG_CACHE[config_path] = (mtime, size, parser)
+        return parser
+
+# Количество чтений конфигурационных файлов с диска с начала работы
+def config_read_count() -> int:
+    return _CONFIG_READ_COUNT
+
 # Значение из конфигурационного файла
 def config_value(path: str | None, section: str, key: str, fallback: any = None) -> str | int | float | bool | None:
-    # Чтение конфигурационного файла
-    config_path = os.path.join(main_folder(), 'config.ini') if path is None else path
-    parser = configparser.ConfigParser()
-    parser.read(config_path)
+    # Чтение конфигурационного файла (из кэша, если файл не менялся)
+    parser = _config_parser(_config_path(path))
 
     # Приведение представления значения к соответствующему типу
     try:
         value_str = parser.get(section, key, fallback=fallback)
-        if value_str is None:
+        if value_str is None or not isinstance(value_str, str):
             return fallback
         if value_str.lower() in ('true', 'yes', '1', 'on'):
             return True
@@ -50,19 +88,53 @@ def config_value(path: str | None, section: str, key: str, fallback: any = None)
     except (configparser.NoSectionError, configparser.NoOptionError):
         return fallback
 
+# Строковое значение из конфигурационного файла (без приведения типа)
+def config_str(path: str | None, section: str, key: str, fallback: str | None = None) -> str | None:
+    return _config_parser(_config_path(path)).get(section, key, fallback=fallback)
+
+# Целое значение из конфигурационного файла
+def config_int(path: str | None, section: str, key: str, fallback: int | None = None) -> int | None:
+    try:
+        return _config_parser(_config_path(path)).getint(section, key, fallback=fallback)
+    except ValueError:
+        return fallback
+
+# Вещественное значение из конфигурационного файла
+def config_float(path: str | None, section: str, key: str, fallback: float | None = None) -> float | None:
+    try:
+        return _config_parser(_config_path(path)).getfloat(section, key, fallback=fallback)
+    except ValueError:
+        return fallback
+
+# Логическое значение из конфигурационного файла
+def config_bool(path: str | None, section: str, key: str, fallback: bool | None = None) -> bool | None:
+    try:
+        return _config_parser(_config_path(path)).getboolean(section, key, fallback=fallback)
+    except ValueError:
+        return fallback
+
 # Запись значения в конфигурационный файл
 def set_config_value(path: str | None, section: str, key: str, value: str | int | float | bool):
-    # Чтение конфигурационного файла
-    config_path = os.path.join(main_folder(), 'config.ini') if path is None else path
-    parser = configparser.ConfigParser()
-    parser.read(config_path)
+    config_path = _config_path(path)
+
+    with _CONFIG_LOCK:
+        # Чтение конфигурационного файла (кэшированный парсер не меняем)
+        parser = configparser.ConfigParser()
+        parser.read(config_path)
+
+        # Установка значения
+        if not parser.has_section(section):
+            parser.add_section(section)
+        parser.set(section, key, str(value))
 
-    # Установказначения
-    parser.set(section, key, str(value))
+        # Перезапись файла через временный: при сбое остается прежний файл
+        temp_path = f'{config_path}.tmp'
+        with open(temp_path, 'w') as config_file:
+            parser.write(config_file)
+        os.replace(temp_path, config_path)
 
-    # Перезапись файла
-    with open(config_path, 'w') as config_file:
-        parser.write(config_file)
+        # Следующее чтение возьмет новый файл
+        _CONFIG_CACHE.pop(config_path, None)
 
 # Экземпляр логгера
 _MAIN_LOGGER = None
@@ -74,22 +146,46 @@ def set_logging_level(level: int):
     global _LOGGING_LEVEL
     _LOGGING_LEVEL = level
 
+# Фоновый поток записи лога
+_LOG_LISTENER = None
+_LOGGER_LOCK = threading.Lock()
+
 # Создание экземпляра логгера
+# Записи передаются через очередь в фоновый поток, который пишет их в файл с ротацией по размеру
 def _create_logger():
-    # Чтение имени файлов лога и установка параметров логгирования
+    global _MAIN_LOGGER, _LOG_LISTENER
+
+    # Чтение имени файлов лога и параметров ротации
     log_file_name = config_value(None, 'MAIN', 'log_file_name', 'events.log')
-    logging.basicConfig(
-        level=_LOGGING_LEVEL,
-        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-        filename=os.path.join(main_folder(), log_file_name),
-        filemode='a'
+    log_max_size_mb = config_float(None, 'MAIN', 'log_max_size_mb', 10)
+    log_backup_count = config_int(None, 'MAIN', 'log_backup_count', 3)
+
+    file_handler = RotatingFileHandler(
+        os.path.join(main_folder(), log_file_name),
+        maxBytes=int(log_max_size_mb * 1024 * 1024),
+        backupCount=log_backup_count,
+        encoding='utf-8'
     )
+    file_handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+
+    # Потоки приложения только ставят записи в очередь
+    log_queue = queue.SimpleQueue()
+    _LOG_LISTENER = QueueListener(log_queue, file_handler, respect_handler_level=True)
+    _LOG_LISTENER.start()
+    atexit.register(_LOG_LISTENER.stop)
+
+    # Установка параметров логгирования
+    root_logger = logging.getLogger()
+    root_logger.setLevel(_LOGGING_LEVEL)
+    root_logger.addHandler(QueueHandler(log_queue))
+
     # Получение экземпляра логгера
-    global _MAIN_LOGGER
     _MAIN_LOGGER = logging.getLogger('OS Assistant')
 
 # Экземпляр логгера
 def main_logger() -> logging.Logger:
     if _MAIN_LOGGER is None:
-        _create_logger()
-    return _MAIN_LOGGER
\ No newline at end of file
+        with _LOGGER_LOCK:
+            if _MAIN_LOGGER is None:
+                _create_logger()
+    return _MAIN_LOGGER